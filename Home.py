@@ -1,15 +1,10 @@
 import streamlit as st
-import plotly.graph_objects as go
-import time
-from datetime import datetime
-import requests
-import os 
 from scannercomponents.nutrigrade import get_nutrigrade_html
 
 # --- Import local utils modules ---
 try:
     from utils.state_manager import init_session_state, add_intake, delete_intake
-    from utils.components import load_css, donut_chart, stat_card, calculate_diabetes_risk
+    from utils.components import load_css, show_donut, stat_card, calculate_diabetes_risk, rerun_fragment
 
 except ImportError:
     # Temp fix for missing utils
@@ -299,32 +294,6 @@ if not st.session_state.intro_shown:
             st.session_state.intro_shown = True
             st.rerun()
 
-# --- 2.2 HELPER: JAMAI FUNCTION ---
-def call_jamai_api(drink_name, sweetness_pct):
-    time.sleep(1.0) 
-    drink_name_lower = drink_name.lower()
-    base_sugar = 30 
-    is_soda = any(x in drink_name_lower for x in ["coke", "cola", "pepsi", "100", "sprite", "7up", "sarsi", "f&n", "fanta"])
-    if is_soda:
-        base_sugar = 35 
-    else:
-        if "teh" in drink_name_lower or "tea" in drink_name_lower: base_sugar = 24
-        elif "kopi" in drink_name_lower or "coffee" in drink_name_lower: base_sugar = 18
-        elif "milo" in drink_name_lower: base_sugar = 20
-
-    final_sugar = int(base_sugar * (sweetness_pct / 100))
-    
-    if final_sugar <= 1: grade = "A"
-    elif final_sugar <= 10: grade = "B"
-    elif final_sugar <= 25: grade = "C"
-    else: grade = "D"
-
-    return {
-        "sugar": final_sugar,
-        "grade": grade,
-        "display_sweetness": f"{sweetness_pct}%"
-    }
-
 # ==========================================
 # 3. Main Layout
 # ==========================================
@@ -343,169 +312,188 @@ with col_h2:
 st.markdown(f'<div class="header-subtitle">{t["subtitle"]}</div>', unsafe_allow_html=True)
 
 # --- Analytics ---
-st.markdown("---")
-st.subheader(t["today_analytics"])
+def show_today_analytics():
+    """Today's sugar and fat donuts with what is left of the daily and monthly limits."""
+    st.markdown("---")
+    st.subheader(t["today_analytics"])
 
-c1, c2 = st.columns(2)
+    c1, c2 = st.columns(2)
 
-# SUGAR CARD
-with c1:
-    with st.container(border=True):
-        st.markdown(f"<h5 style='text-align: center; margin-bottom: 0;'>{t['sugar_label']}</h5>", unsafe_allow_html=True)
-        st.plotly_chart(donut_chart(st.session_state.sugar_today, LIMIT_SUGAR_DAILY, 'Sugar'), width='stretch', config={'displayModeBar':False})
-        
-        rem_day_sugar = max(0, LIMIT_SUGAR_DAILY - st.session_state.sugar_today)
-        rem_month_sugar = max(0, LIMIT_SUGAR_MONTHLY - st.session_state.sugar_month_total)
-        day_color = "#ef4444" if rem_day_sugar <= 5 else "#0f172a"
-        
-        st.markdown(f"""
-        <div style="display: flex; justify-content: space-around; margin-top: 10px; border-top: 1px solid #f1f5f9; padding-top: 12px;">
-            <div style="text-align: center;">
-                <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['daily_left']}</div>
-                <div style="font-size: 1.2rem; font-weight: 800; color: {day_color};">{rem_day_sugar:.1f}g</div>
+    # SUGAR CARD
+    with c1:
+        with st.container(border=True):
+            st.markdown(f"<h5 style='text-align: center; margin-bottom: 0;'>{t['sugar_label']}</h5>", unsafe_allow_html=True)
+            show_donut(st.session_state.sugar_today, LIMIT_SUGAR_DAILY, 'Sugar')
+
+            rem_day_sugar = max(0, LIMIT_SUGAR_DAILY - st.session_state.sugar_today)
+            rem_month_sugar = max(0, LIMIT_SUGAR_MONTHLY - st.session_state.sugar_month_total)
+            day_color = "#ef4444" if rem_day_sugar <= 5 else "#0f172a"
+
+            st.markdown(f"""
+            <div style="display: flex; justify-content: space-around; margin-top: 10px; border-top: 1px solid #f1f5f9; padding-top: 12px;">
+                <div style="text-align: center;">
+                    <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['daily_left']}</div>
+                    <div style="font-size: 1.2rem; font-weight: 800; color: {day_color};">{rem_day_sugar:.1f}g</div>
+                </div>
+                <div style="border-right: 1px solid #e2e8f0;"></div>
+                <div style="text-align: center;">
+                    <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['monthly_left']}</div>
+                    <div style="font-size: 1.2rem; font-weight: 800; color: #0f172a;">{rem_month_sugar:.1f}g</div>
+                </div>
             </div>
-            <div style="border-right: 1px solid #e2e8f0;"></div>
-            <div style="text-align: center;">
-                <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['monthly_left']}</div>
-                <div style="font-size: 1.2rem; font-weight: 800; color: #0f172a;">{rem_month_sugar:.1f}g</div>
+            """, unsafe_allow_html=True)
+
+    # FAT CARD
+    with c2:
+        with st.container(border=True):
+            st.markdown(f"<h5 style='text-align: center; margin-bottom: 0;'>{t['fat_label']}</h5>", unsafe_allow_html=True)
+            show_donut(st.session_state.fat_today, LIMIT_FAT_DAILY, 'Fat')
+
+            rem_day_fat = max(0, LIMIT_FAT_DAILY - st.session_state.fat_today)
+            rem_month_fat = max(0, LIMIT_FAT_MONTHLY - st.session_state.fat_month_total)
+
+            st.markdown(f"""
+            <div style="display: flex; justify-content: space-around; margin-top: 10px; border-top: 1px solid #f1f5f9; padding-top: 12px;">
+                <div style="text-align: center;">
+                    <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['daily_left']}</div>
+                    <div style="font-size: 1.2rem; font-weight: 800; color: #0f172a;">{rem_day_fat:.1f}g</div>
+                </div>
+                <div style="border-right: 1px solid #e2e8f0;"></div>
+                <div style="text-align: center;">
+                    <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['monthly_left']}</div>
+                    <div style="font-size: 1.2rem; font-weight: 800; color: #0f172a;">{rem_month_fat:.1f}g</div>
+                </div>
             </div>
-        </div>
-        """, unsafe_allow_html=True)
+            """, unsafe_allow_html=True)
 
-# FAT CARD
-with c2:
+# ==========================================
+# 4. POTONG KAKI PREDICTOR
+# ==========================================
+@st.fragment
+def show_risk_predictor():
+    """
+    The risk calculator. A fragment: typing in its inputs or pressing its
+    button reruns only this card.
+    """
+    st.markdown("<br>", unsafe_allow_html=True)
     with st.container(border=True):
-        st.markdown(f"<h5 style='text-align: center; margin-bottom: 0;'>{t['fat_label']}</h5>", unsafe_allow_html=True)
-        st.plotly_chart(donut_chart(st.session_state.fat_today, LIMIT_FAT_DAILY, 'Fat'), width='stretch', config={'displayModeBar':False})
-        
-        rem_day_fat = max(0, LIMIT_FAT_DAILY - st.session_state.fat_today)
-        rem_month_fat = max(0, LIMIT_FAT_MONTHLY - st.session_state.fat_month_total)
-        
         st.markdown(f"""
-        <div style="display: flex; justify-content: space-around; margin-top: 10px; border-top: 1px solid #f1f5f9; padding-top: 12px;">
-            <div style="text-align: center;">
-                <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['daily_left']}</div>
-                <div style="font-size: 1.2rem; font-weight: 800; color: #0f172a;">{rem_day_fat:.1f}g</div>
-            </div>
-            <div style="border-right: 1px solid #e2e8f0;"></div>
-            <div style="text-align: center;">
-                <div style="font-size: 0.8rem; color: #64748b; font-weight: 600;">{t['monthly_left']}</div>
-                <div style="font-size: 1.2rem; font-weight: 800; color: #0f172a;">{rem_month_fat:.1f}g</div>
+        <div class="predictor-header">
+            <span style="font-size: 24px;">🧬</span>
+            <div>
+                <span style="font-weight: bold; font-size: 1.1rem;">{t['pk_title']}</span><br>
+                <span style="font-size: 0.8rem; opacity: 0.8;">{t['risk_intro']}</span>
             </div>
         </div>
         """, unsafe_allow_html=True)
 
-# ==========================================
-# 4. POTONG KAKI PREDICTOR
-# ==========================================
-st.markdown("<br>", unsafe_allow_html=True)
-with st.container(border=True):
-    st.markdown(f"""
-    <div class="predictor-header">
-        <span style="font-size: 24px;">🧬</span>
-        <div>
-            <span style="font-weight: bold; font-size: 1.1rem;">{t['pk_title']}</span><br>
-            <span style="font-size: 0.8rem; opacity: 0.8;">{t['risk_intro']}</span>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    pk_c1, pk_c2, pk_c3 = st.columns(3)
-    with pk_c1: pk_age = st.number_input(t['age'], 10, 100, 20)
-    with pk_c2: pk_weight = st.number_input(t['weight'], 30, 200, 60)
-    with pk_c3: pk_height = st.number_input(t['height'], 100, 250, 170)
+        pk_c1, pk_c2, pk_c3 = st.columns(3)
+        with pk_c1: pk_age = st.number_input(t['age'], 10, 100, 20)
+        with pk_c2: pk_weight = st.number_input(t['weight'], 30, 200, 60)
+        with pk_c3: pk_height = st.number_input(t['height'], 100, 250, 170)
 
-    st.markdown("<br>", unsafe_allow_html=True)
-    # UNIFIED BUTTON COLOR (TEAL)
-    if st.button(t['btn_calc_risk'], type="primary", use_container_width=True):
-        # Dismiss intro if user interacts with the app
-        st.session_state.intro_shown = True
-        
-        if pk_height > 0:
-            bmi = pk_weight / ((pk_height/100)**2)
-            current_sugar = st.session_state.sugar_today
-            res = calculate_diabetes_risk(bmi, current_sugar)
-            
-            # Convert risk score (multiplier) to percentage increase
-            # e.g. 1.2x risk -> 20% higher risk
-            risk_pct = int((res['risk_score'] - 1.0) * 100)
-            
-            risk_color = "#10b981" # Green (< 50%)
-            if risk_pct >= 100:
-                risk_color = "#ef4444" # Red
-            elif risk_pct >= 50:
-                risk_color = "#f59e0b" # Yellow
-            
-            st.markdown(f"""
-            <div class="risk-score-card" style="border-color: {risk_color}; background-color: {risk_color}10;">
-                <h3 style="color: {risk_color}; margin: 0;">{risk_pct}{t['risk_result_title']}</h3>
-                <p style="margin: 5px 0 0 0; font-size: 0.9rem; color: #555;">{t['risk_result_desc']}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        st.markdown("<br>", unsafe_allow_html=True)
+        # UNIFIED BUTTON COLOR (TEAL)
+        if st.button(t['btn_calc_risk'], type="primary", use_container_width=True):
+            # Dismiss intro if user interacts with the app
+            st.session_state.intro_shown = True
+
+            if pk_height > 0:
+                bmi = pk_weight / ((pk_height/100)**2)
+                current_sugar = st.session_state.sugar_today
+                res = calculate_diabetes_risk(bmi, current_sugar)
 
-            res_c1, res_c2, res_c3 = st.columns(3)
-            with res_c1: st.info(f"**{t['bmi_label']}**\n\n{t['bmi_msg']} **{bmi:.1f}** ({res['bmi_status']}).") 
-            with res_c2: st.warning(f"**{t['sugar_penalty']}**\n\n{t['sugar_msg'].format(res['limit_pct'])}") 
-            with res_c3: st.error(f"**{t['future_view']}**\n\n{t['future_msg']} **+{res['yearly_gain']}kg** / year.")
+                # Convert risk score (multiplier) to percentage increase
+                # e.g. 1.2x risk -> 20% higher risk
+                risk_pct = int((res['risk_score'] - 1.0) * 100)
+
+                risk_color = "#10b981" # Green (< 50%)
+                if risk_pct >= 100:
+                    risk_color = "#ef4444" # Red
+                elif risk_pct >= 50:
+                    risk_color = "#f59e0b" # Yellow
 
-            if current_sugar > 0:
                 st.markdown(f"""
-                <div style="margin-top: 10px; padding: 10px; border: 1px dashed #ccc; border-radius: 8px; text-align: center;">
-                    🏃‍♂️ {t['walk_msg']} <b>{res['steps_needed']} {t['steps']}</b> {t['burn']}
+                <div class="risk-score-card" style="border-color: {risk_color}; background-color: {risk_color}10;">
+                    <h3 style="color: {risk_color}; margin: 0;">{risk_pct}{t['risk_result_title']}</h3>
+                    <p style="margin: 5px 0 0 0; font-size: 0.9rem; color: #555;">{t['risk_result_desc']}</p>
                 </div>
                 """, unsafe_allow_html=True)
 
+                res_c1, res_c2, res_c3 = st.columns(3)
+                with res_c1: st.info(f"**{t['bmi_label']}**\n\n{t['bmi_msg']} **{bmi:.1f}** ({res['bmi_status']}).") 
+                with res_c2: st.warning(f"**{t['sugar_penalty']}**\n\n{t['sugar_msg'].format(res['limit_pct'])}") 
+                with res_c3: st.error(f"**{t['future_view']}**\n\n{t['future_msg']} **+{res['yearly_gain']}kg** / year.")
+
+                if current_sugar > 0:
+                    st.markdown(f"""
+                    <div style="margin-top: 10px; padding: 10px; border: 1px dashed #ccc; border-radius: 8px; text-align: center;">
+                        🏃‍♂️ {t['walk_msg']} <b>{res['steps_needed']} {t['steps']}</b> {t['burn']}
+                    </div>
+                    """, unsafe_allow_html=True)
+
 # ==========================================
 # 5. JAMAI ANALYZER (MOVED TO SCANNER PAGE)
 # ==========================================
 # The JamAI Analyzer section has been moved to pages/1_📷_Scanner.py as requested.
 
 # --- Consumption History ---
-st.markdown("---")
-with st.expander(f"📜 {t['history_title']}", expanded=False):
-    if not st.session_state.history:
-        st.caption(t['history_empty'])
-    else:
-        # Icons
-        sugar_icon_html = """<span style="display: inline-block; width: 14px; height: 14px; background-color: white; border: 1.5px solid #1E293B; margin-right: 6px; border-radius: 3px; box-shadow: 3px 3px 0px #94A3B8; vertical-align: middle;"></span>"""
-        fat_icon_svg = """<svg viewBox="0 0 24 24" fill="#FACC15" stroke="#B45309" stroke-width="2" xmlns="http://www.w3.org/2000/svg" style="width: 100%; height: 100%; display: block;"><path d="M12 2L7.5 10C5.5 13.5 5.5 18 12 22C18.5 18 18.5 13.5 16.5 10L12 2Z"/></svg>"""
-        fat_icon_html = f"""<span style="display: inline-block; width: 14px; height: 14px; margin-right: 6px; vertical-align: middle;">{fat_icon_svg}</span>"""
-
-        # Legend (Icons)
-        st.markdown(f"""
-        <div style="display: flex; justify-content: flex-end; gap: 16px; font-size: 11px; color: #475569; margin-bottom: 10px; align-items: center;">
-            <div style="display: flex; align-items: center;">
-                {sugar_icon_html} {t['sugar_label']}
-            </div>
-            <div style="display: flex; align-items: center;">
-                {fat_icon_html} {t['fat_label']}
+def show_history():
+    """The history list; deleting an entry reruns the dashboard fragment (totals change)."""
+    st.markdown("---")
+    with st.expander(f"📜 {t['history_title']}", expanded=False):
+        if not st.session_state.history:
+            st.caption(t['history_empty'])
+        else:
+            # Icons
+            sugar_icon_html = """<span style="display: inline-block; width: 14px; height: 14px; background-color: white; border: 1.5px solid #1E293B; margin-right: 6px; border-radius: 3px; box-shadow: 3px 3px 0px #94A3B8; vertical-align: middle;"></span>"""
+            fat_icon_svg = """<svg viewBox="0 0 24 24" fill="#FACC15" stroke="#B45309" stroke-width="2" xmlns="http://www.w3.org/2000/svg" style="width: 100%; height: 100%; display: block;"><path d="M12 2L7.5 10C5.5 13.5 5.5 18 12 22C18.5 18 18.5 13.5 16.5 10L12 2Z"/></svg>"""
+            fat_icon_html = f"""<span style="display: inline-block; width: 14px; height: 14px; margin-right: 6px; vertical-align: middle;">{fat_icon_svg}</span>"""
+
+            # Legend (Icons)
+            st.markdown(f"""
+            <div style="display: flex; justify-content: flex-end; gap: 16px; font-size: 11px; color: #475569; margin-bottom: 10px; align-items: center;">
+                <div style="display: flex; align-items: center;">
+                    {sugar_icon_html} {t['sugar_label']}
+                </div>
+                <div style="display: flex; align-items: center;">
+                    {fat_icon_html} {t['fat_label']}
+                </div>
             </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        for item in reversed(st.session_state.history):
-            s_val = item['sugar']
-            f_val = item.get('fat', 0)
-            
-            if s_val <= 1: h_grade = "A"
-            elif s_val <= 10: h_grade = "B"
-            elif s_val <= 25: h_grade = "C"
-            else: h_grade = "D"
-
-            c1, c2, c3, c4, c5 = st.columns([0.8, 3, 1.2, 1.2, 0.8])
-            with c1:
-                st.markdown(get_nutrigrade_html(h_grade, 'sm'), unsafe_allow_html=True)
-            with c2: 
-                st.markdown(f"<div style='padding-top:5px; font-weight:600;'>{item['name']}</div>", unsafe_allow_html=True)
-            with c3:
-                st.markdown(f"<div style='display: flex; align-items: center; padding-top:5px; color:#334155; font-weight:bold;'>{sugar_icon_html} {s_val}g</div>", unsafe_allow_html=True)
-            with c4:
-                st.markdown(f"<div style='display: flex; align-items: center; padding-top:5px; color:#334155; font-weight:bold;'>{fat_icon_html} {f_val}g</div>", unsafe_allow_html=True)
-            with c5:
-                if st.button(t['btn_delete'], key=f"del_{item['id']}"):
-                    delete_intake(item['id'])
-                    st.rerun()
-            st.markdown("<hr style='margin: 5px 0; border-top: 1px solid #f1f5f9;'>", unsafe_allow_html=True)
+            """, unsafe_allow_html=True)
+
+            for item in reversed(st.session_state.history):
+                s_val = item['sugar']
+                f_val = item.get('fat', 0)
+                h_grade = item['grade']  # Stored when the drink was added
+
+                c1, c2, c3, c4, c5 = st.columns([0.8, 3, 1.2, 1.2, 0.8])
+                with c1:
+                    st.markdown(get_nutrigrade_html(h_grade, 'sm'), unsafe_allow_html=True)
+                with c2: 
+                    st.markdown(f"<div style='padding-top:5px; font-weight:600;'>{item['name']}</div>", unsafe_allow_html=True)
+                with c3:
+                    st.markdown(f"<div style='display: flex; align-items: center; padding-top:5px; color:#334155; font-weight:bold;'>{sugar_icon_html} {s_val}g</div>", unsafe_allow_html=True)
+                with c4:
+                    st.markdown(f"<div style='display: flex; align-items: center; padding-top:5px; color:#334155; font-weight:bold;'>{fat_icon_html} {f_val}g</div>", unsafe_allow_html=True)
+                with c5:
+                    if st.button(t['btn_delete'], key=f"del_{item['id']}"):
+                        delete_intake(item['id'])
+                        rerun_fragment()
+                st.markdown("<hr style='margin: 5px 0; border-top: 1px solid #f1f5f9;'>", unsafe_allow_html=True)
+
+# --- Dashboard ---
+@st.fragment
+def show_dashboard():
+    """
+    Everything that depends on the logged drinks. A fragment: deleting a
+    history entry redraws the donuts and the list, not the header, styles or nav.
+    """
+    show_today_analytics()
+    show_risk_predictor()
+    show_history()
+
+show_dashboard()
 
 # --- Bottom Nav ---
 st.markdown("<br><br>", unsafe_allow_html=True)
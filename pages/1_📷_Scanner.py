@@ -1,9 +1,13 @@
 import streamlit as st
 import time
+import uuid
 import services.jamai_service as jamai_service
+from services.image_prep import prepare_image, PreparedImage, find_near_duplicate, remember_scan
 from scannercomponents.item_result import show_single_item_result
 from scannercomponents.menu_result import show_menu_result
 from utils.state_manager import add_intake, init_session_state
+from utils.grading import nutrigrade, nutrigrades
+from utils.components import rerun_fragment
 
 # --- TRANSLATIONS ---
 TRANS = {
@@ -53,7 +57,14 @@ TRANS = {
         "s_std": "🔴 Standard (100%)",
         "s_extra": "🟣 Extra Sugar ({}%)",
         "msg_added_menu": "✅ Added {} items to daily log.",
-        "msg_added_single": "✅ Added {} to daily log."
+        "msg_added_single": "✅ Added {} to daily log.",
+        "img_optimized": "🗜️ Image optimized before upload: {} → {} ({} saved)",
+        "force_fresh": "🔄 Force fresh analysis (ignore similar recent scans)",
+        "reused_scan": "♻️ This photo looks like one analyzed moments ago, so that result is shown. Tick \"Force fresh analysis\" to scan it again.",
+        "menu_streaming": "⏳ Reading the menu... {} drink(s) so far",
+        "menu_partial": "⚠️ Part of the menu could not be read; showing the {} drink(s) that were.",
+        "menu_failed": "Could not analyze menu. Please try again.",
+        "btn_cancel_scan": "✖ Cancel Scan"
     },
     "Malay": {
         "page_title": "🥤 Pengimbas Minuman",
@@ -101,7 +112,14 @@ TRANS = {
         "s_std": "🔴 Biasa (100%)",
         "s_extra": "🟣 Lebih Manis ({}%)",
         "msg_added_menu": "✅ Ditambah {} item ke log harian.",
-        "msg_added_single": "✅ Ditambah {} ke log harian."
+        "msg_added_single": "✅ Ditambah {} ke log harian.",
+        "img_optimized": "🗜️ Imej dioptimumkan sebelum muat naik: {} → {} (jimat {})",
+        "force_fresh": "🔄 Paksa analisis baharu (abaikan imbasan serupa)",
+        "reused_scan": "♻️ Foto ini serupa dengan imbasan sebentar tadi, jadi keputusan itu dipaparkan. Tandakan \"Paksa analisis baharu\" untuk imbas semula.",
+        "menu_streaming": "⏳ Membaca menu... {} minuman setakat ini",
+        "menu_partial": "⚠️ Sebahagian menu tidak dapat dibaca; memaparkan {} minuman yang berjaya.",
+        "menu_failed": "Tidak dapat menganalisis menu. Sila cuba lagi.",
+        "btn_cancel_scan": "✖ Batal Imbasan"
     }
 }
 
@@ -135,6 +153,12 @@ button[kind="secondary"]:hover {
 """, unsafe_allow_html=True)
 
 # --- 1. ROBUST SELF-CONTAINED STATE INITIALIZATION ---
+def cancel_scan_job():
+    """Stops the background scan of this session, if any (upload and generation included)."""
+    active = st.session_state.pop("scan_job", None)
+    if active:
+        active["job"].cancel()
+
 def init_scanner_state():
     """
     Initializes all necessary session state variables directly in this file.
@@ -159,6 +183,7 @@ def init_scanner_state():
     if st.session_state.get('last_page') != 'Scanner':
         st.session_state.page = 'home'
         st.session_state.scan_results = None
+        cancel_scan_job()
     
     # Mark current page as Scanner
     st.session_state['last_page'] = 'Scanner'
@@ -176,6 +201,7 @@ t = TRANS[lang]
 
 # --- NAVIGATION HELPER ---
 def go(page):
+    cancel_scan_job() # Leaving the camera / upload page abandons its scan
     st.session_state.page = page
 
 def clear_results():
@@ -206,142 +232,244 @@ def create_action_card(col, icon_url, title, button_label, key, nav_target):
         if st.button(button_label, key=key, use_container_width=True):
             go(nav_target)
 
-# --- HELPER: Nutri-Grade Calculation ---
-def calculate_nutrigrade(sugar_value, saturatedFat_value):
+# --- HELPER: Sweetness Levels ---
+SWEETNESS_LEVELS = range(0, 151, 25) # Same steps as the sweetness sliders
+
+def scale_to_sweetness(base, sweetness_pct):
     """
-    Recalculates Nutri-Grade based on sugar and saturated fat per 100ml.
-    Logic provided by user.
+    Derives one sweetness level from the standard (100%) analysis.
+    Only sugar scales with sweetness; saturated fat stays the same.
     """
-    initial_grade = ""
-
-    if sugar_value <= 1.0:
-        initial_grade = 'A'
-    elif 1.0 < sugar_value <= 5.0:
-        initial_grade = 'B'
-    elif 5.0 < sugar_value <= 10.0:
-        initial_grade = 'C'
-    elif sugar_value > 10.0:
-        initial_grade = 'D'
-    else:
-        initial_grade = 'D' # Fallback
+    multiplier = sweetness_pct / 100.0
+    scaled = dict(base)
+    scaled['sugar_g'] = base['sugar_g'] * multiplier
+    scaled['sugar_100g'] = base['sugar_100g'] * multiplier
+    scaled['grade'] = nutrigrade(scaled['sugar_100g'], scaled['fat_100g'])
+    return scaled
+
+def store_sweetness_levels(base, sweetness_pct, source=None):
+    """
+    Pre-computes every slider level from one JamAI answer and shows the selected one.
+    """
+    levels = {pct: scale_to_sweetness(base, pct) for pct in SWEETNESS_LEVELS}
+    st.session_state.scan_results = {"type": "single", "data": levels[sweetness_pct], "levels": levels}
+    if source:
+        st.session_state.scan_results["source"] = source
 
-    if initial_grade == 'D':
-         final_grade = 'D'
+def apply_sweetness(slider_key):
+    """
+    Slider callback: swaps in the pre-computed level instead of asking JamAI again.
+    """
+    results = st.session_state.scan_results
+    if "scan_job" in st.session_state:
+        # Still analyzing: the finished scan opens at the new level
+        st.session_state.scan_job["sweetness"] = st.session_state[slider_key]
+    elif results and results.get("levels"):
+        results["data"] = results["levels"][st.session_state[slider_key]]
     else:
-        final_grade = initial_grade
-
-        if final_grade == 'A' and saturatedFat_value > 0.7:
-            final_grade = 'B'
-
-        if final_grade == 'B' and saturatedFat_value > 1.2:
-            final_grade = 'C'
+        clear_results()
+
+# --- HELPER: Menu Grading ---
+SCAN_POLL_SECONDS = 0.5 # How often a running scan (and a streaming menu list) is polled
+
+def grade_menu(items):
+    """Copies the menu items and grades them locally (whole menu at once)."""
+    menu_data = [dict(item) for item in items]
+    grades = nutrigrades([m['sugar_100g'] for m in menu_data], [m['fat_100g'] for m in menu_data])
+    for menu_item, grade in zip(menu_data, grades):
+        menu_item['grade'] = str(grade)
+    return menu_data
+
+# --- HELPER: Byte Size Label ---
+def format_bytes(num_bytes):
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.1f} MB"
+    return f"{num_bytes / 1024:.0f} KB"
+
+# --- HELPER: Mode Names ---
+MODE_KEYS = {
+    "Nutrition Label": "tab_label",
+    "Fresh Drinks": "tab_fresh",
+    "Menu Scan": "tab_menu"
+}
 
-        if final_grade == 'C' and saturatedFat_value > 2.8:
-            final_grade = 'D'
-            
-    return final_grade
+# --- HELPER: Mode Tab Bar ---
+@st.fragment
+def show_mode_tabs():
+    """
+    Scan mode tabs. A fragment: on this page only the tab bar shows the mode,
+    so switching reruns just the tabs (or the page, if a result has to go).
+    """
+    for col, (mode, tab_key) in zip(st.columns(3), MODE_KEYS.items()):
+        with col:
+            if st.button(t[tab_key], use_container_width=True, type="primary" if st.session_state.mode == mode else "secondary"):
+                had_results = st.session_state.scan_results is not None
+                st.session_state.mode = mode
+                st.session_state.scan_results = None
+                cancel_scan_job()
+                reset_scanner_ui_state()
+                if had_results:
+                    st.rerun()
+                rerun_fragment()
 
 # --- HELPER: Shared Analysis Logic ---
-def perform_analysis(image_file, multiplier=1.0):
+def perform_analysis(image_file, sweetness_pct=100, force_fresh=False):
     """
-    Performs the analysis and stores the result in session state.
+    Starts the analysis as a background job (see show_scan_progress); the
+    result lands in session state when it is done. The same picture scanned
+    recently in this session (same mode and language) reuses that result
+    unless force_fresh is set.
     """
     # Get current language
     lang = st.session_state.get('lang', 'English')
 
-    # 1. MENU SCAN MODE
+    # Shrink the photo for this mode before it is uploaded (menus keep more pixels)
+    profile = {"Menu Scan": "menu", "Fresh Drinks": "drink"}.get(st.session_state.mode, "label")
+    image_file = prepare_image(image_file, profile)
+    if isinstance(image_file, PreparedImage) and image_file.bytes_saved:
+        st.caption(t['img_optimized'].format(
+            format_bytes(image_file.original_bytes),
+            format_bytes(image_file.prepared_bytes),
+            format_bytes(image_file.bytes_saved)
+        ))
+
+    # A new scan replaces (and cancels) the previous one
+    cancel_scan_job()
+    st.session_state.scan_results = None
+
+    # Reuse a recent result of this session for the same picture
+    scope = (st.session_state.mode, lang)
+    if not force_fresh:
+        previous = find_near_duplicate(scope, image_file)
+        if previous:
+            st.session_state.scan_results = dict(previous)
+            if previous.get("levels"):
+                st.session_state.scan_results["data"] = previous["levels"][sweetness_pct]
+            st.info(t['reused_scan'])
+            return
+
+    # 1. MENU SCAN MODE (streams; drinks are listed as soon as each one is extracted)
     if st.session_state.mode == "Menu Scan":
-        status_msg = st.empty()
-        status_msg.success("Menu detected! Extracting items...")
-        
-        # Call JamAI Menu Analysis
-        result_json = jamai_service.analyze_menu_with_jamai(image_file)
-        
-        status_msg.empty()
-        
-        # Handle different JSON keys (menuitems vs menu_items)
-        items_list = []
-        if result_json:
-            items_list = result_json.get("menuitems") or result_json.get("menu_items")
-
-        if items_list:
-            menu_data = []
-            for item in items_list:
-                # Normalize keys to match what show_menu_result expects
-                # New JSON structure support
-                sugar_serving = float(item.get('sugar_per_serving', item.get('sugarg', item.get('sugar_g', 0))))
-                fat_serving = float(item.get('saturated_fat_per_serving', item.get('fatg', item.get('fat_g', 0))))
-                
-                sugar_100 = float(item.get('sugar_per_100ml', 0))
-                fat_100 = float(item.get('saturated_fat_per', 0))
-
-                # Recalculate grade locally
-                calculated_grade = calculate_nutrigrade(sugar_100, fat_100)
-
-                menu_data.append({
-                    'name': item.get('name', 'Unknown Item'),
-                    'grade': calculated_grade,
-                    'sugar_g': sugar_serving,
-                    'fat_g': fat_serving,
-                    'sugar_100g': sugar_100,
-                    'fat_100g': fat_100
-                })
-            
-            st.session_state.scan_results = {"type": "menu", "data": menu_data}
-        else:
-            st.error("Could not analyze menu. Please try again.")
-            if result_json:
-                st.json(result_json) # Debugging aid
-            st.session_state.scan_results = None
+        job = jamai_service.start_menu_scan(image_file)
 
-    # 2. FRESH DRINKS MODE
+    # 2. FRESH DRINKS MODE (always standard sweetness; other levels are derived locally)
     elif st.session_state.mode == "Fresh Drinks":
-        result_data = jamai_service.analyze_drink_with_jamai(image_file, multiplier, language=lang)
-        
-        if result_data:
-            # --- Check if it is a beverage ---
-            if result_data.get('is_beverage') is False:
-                st.session_state.scan_results = {"type": "not_beverage", "data": result_data}
-            else:
-                st.session_state.scan_results = {"type": "single", "data": result_data}
-        else:
-            st.error("Could not analyze drink. Please try again.")
-            st.session_state.scan_results = None
+        job = jamai_service.start_drink_scan(image_file, language=lang)
 
     # 3. NUTRITION LABEL MODE (Formerly Single Item)
     else:
-        result_data = jamai_service.analyze_image_with_jamai(image_file, language=lang)
-        
-        if result_data:
-            # --- Check if it is a beverage ---
-            if result_data.get('is_beverage') is False:
-                st.session_state.scan_results = {"type": "not_beverage", "data": result_data}
+        job = jamai_service.start_image_scan(image_file, language=lang)
+
+    if job:
+        st.session_state.scan_job = {
+            "job": job,
+            "mode": st.session_state.mode,
+            "scope": scope,
+            "image": image_file,
+            "sweetness": sweetness_pct
+        }
+
+def finish_scan_job():
+    """
+    Moves a finished background scan into scan_results (once), reports any
+    failure and remembers the photo for near-duplicate reuse.
+    """
+    active = st.session_state.pop("scan_job")
+    job = active["job"]
+    if job.cancelled:
+        return
+
+    # 1. MENU SCAN MODE
+    if active["mode"] == "Menu Scan":
+        menu_data = grade_menu(job.snapshot())
+        job.show_error()
+        if not menu_data:
+            st.error(t['menu_failed'])
+            return
+        if job.error is None and not job.complete:
+            st.warning(t['menu_partial'].format(len(menu_data)))
+        st.session_state.scan_results = {"type": "menu", "data": menu_data}
+        if not job.complete:
+            return # Only a fully read menu is worth reusing
+
+    # 2. FRESH DRINKS / NUTRITION LABEL MODE
+    else:
+        result_data = job.result()
+        if not result_data:
+            job.show_error()
+            if active["mode"] == "Fresh Drinks":
+                st.error("Could not analyze drink. Please try again.")
             else:
-                st.session_state.scan_results = {"type": "single", "data": result_data}
+                st.error("Could not analyze image. Please try again.")
+            return
+
+        # --- Check if it is a beverage ---
+        if result_data.get('is_beverage') is False:
+            st.session_state.scan_results = {"type": "not_beverage", "data": result_data}
+        elif active["mode"] == "Fresh Drinks":
+            store_sweetness_levels(result_data, active["sweetness"])
         else:
-            st.error("Could not analyze image. Please try again.")
-            st.session_state.scan_results = None
+            st.session_state.scan_results = {"type": "single", "data": result_data}
+
+    # Remember this photo for near-duplicate reuse
+    remember_scan(active["scope"], active["image"], dict(st.session_state.scan_results))
+
+def on_add_menu(items):
+    # Update global state via state_manager
+    for item in items:
+        add_intake(item['sugar_g'], item['fat_g'], item['name'], item.get('grade'))
+    
+    # Show success message instead of switching page
+    st.success(t['msg_added_menu'].format(len(items)))
+
+@st.fragment(run_every=SCAN_POLL_SECONDS)
+def show_scan_progress():
+    """
+    Polls the background scan. Only this fragment re-runs, so the page stays
+    usable (a streaming menu list re-sorts as drinks arrive and its buttons
+    keep working). When the scan is done the whole page reruns once.
+    """
+    active = st.session_state.get("scan_job")
+    if not active:
+        return
+
+    job = active["job"]
+    job.touch() # Still on screen: keep the job alive
+    if job.done:
+        st.rerun()
+
+    if active["mode"] == "Menu Scan":
+        menu_data = grade_menu(job.snapshot())
+        st.caption(t['menu_streaming'].format(len(menu_data)))
+        if menu_data:
+            show_menu_result(menu_data, on_add_multiple_callback=on_add_menu, prefetch_ai=False)
+    else:
+        st.info(t['spinner_analyze'].format(t[MODE_KEYS.get(active["mode"], "tab_label")]))
+
+    if st.button(t['btn_cancel_scan'], key="cancel_scan_btn", type="secondary"):
+        cancel_scan_job()
+        st.rerun()
 
 def display_scan_results(key_prefix):
     """
     Displays the results stored in session state.
     """
+    # A scan still running in the background: poll it without blocking the page
+    if "scan_job" in st.session_state:
+        if not st.session_state.scan_job["job"].done:
+            show_scan_progress()
+            return
+        finish_scan_job()
+
     if not st.session_state.scan_results:
         return
 
     result_type = st.session_state.scan_results["type"]
     data = st.session_state.scan_results["data"]
+    result_id = st.session_state.scan_results.setdefault("id", uuid.uuid4().hex) # Same across slider moves
 
     if result_type == "menu":
-        def on_add_menu(items):
-            # Update global state via state_manager
-            for item in items:
-                add_intake(item['sugar_g'], item['fat_g'], item['name'])
-            
-            # Show success message instead of switching page
-            st.success(t['msg_added_menu'].format(len(items)))
-            
-        show_menu_result(data, on_add_multiple_callback=on_add_menu)
+        show_menu_result(data, on_add_multiple_callback=on_add_menu, result_id=result_id)
 
     elif result_type == "not_beverage":
         st.warning("⚠️ No beverage identified. Please input again.")
@@ -354,7 +482,7 @@ def display_scan_results(key_prefix):
     elif result_type == "single":
         def on_add_single(s, f):
             # Update global state via state_manager
-            add_intake(s, f, data['name'])
+            add_intake(s, f, data['name'], data.get('grade'))
             
             # Show success message instead of switching page
             st.success(t['msg_added_single'].format(data['name']))
@@ -363,7 +491,8 @@ def display_scan_results(key_prefix):
             data, 
             None, # Do not show the image again in the result card
             on_confirm_callback=on_add_single,
-            key_prefix=key_prefix
+            key_prefix=key_prefix,
+            result_id=result_id
         )
 
 
@@ -402,28 +531,7 @@ if st.session_state.page == "home":
 
     
     # Custom Tab Bar using Columns and Buttons
-    t_col1, t_col2, t_col3 = st.columns(3)
-    
-    with t_col1:
-        if st.button(t['tab_label'], use_container_width=True, type="primary" if st.session_state.mode == "Nutrition Label" else "secondary"):
-            st.session_state.mode = "Nutrition Label"
-            st.session_state.scan_results = None
-            reset_scanner_ui_state()
-            st.rerun()
-            
-    with t_col2:
-        if st.button(t['tab_fresh'], use_container_width=True, type="primary" if st.session_state.mode == "Fresh Drinks" else "secondary"):
-            st.session_state.mode = "Fresh Drinks"
-            st.session_state.scan_results = None
-            reset_scanner_ui_state()
-            st.rerun()
-            
-    with t_col3:
-        if st.button(t['tab_menu'], use_container_width=True, type="primary" if st.session_state.mode == "Menu Scan" else "secondary"):
-            st.session_state.mode = "Menu Scan"
-            st.session_state.scan_results = None
-            reset_scanner_ui_state()
-            st.rerun()
+    show_mode_tabs()
 
     st.write("")
     col1, col2 = st.columns(2, gap="large")
@@ -437,7 +545,7 @@ if st.session_state.page == "home":
     with st.container(border=True):
         drink_input = st.text_input(t['input_label'], placeholder=t['input_ph'], label_visibility="collapsed")
         st.markdown("<br>", unsafe_allow_html=True)
-        sweetness_pct = st.slider(t['slider_label'], min_value=0, max_value=150, value=100, step=25, key="text_slider")
+        sweetness_pct = st.slider(t['slider_label'], min_value=0, max_value=150, value=100, step=25, key="text_slider", on_change=apply_sweetness, args=("text_slider",))
         
         # Updated Labels Logic
         if sweetness_pct == 0: label = t['s_no']
@@ -453,11 +561,11 @@ if st.session_state.page == "home":
         if st.button(t['btn_analyze_add'], use_container_width=True, type="primary"):
             if drink_input:
                 with st.spinner(t['spinner_ask']):
-                    multiplier = sweetness_pct / 100.0
-                    result = jamai_service.analyze_manual_input_with_jamai(drink_input, multiplier, language=lang)
+                    # Always ask at standard sweetness; other levels are derived locally
+                    result = jamai_service.analyze_manual_input_with_jamai(drink_input, language=lang)
                     
                     if result:
-                        st.session_state.scan_results = {"type": "single", "data": result, "source": "manual"}
+                        store_sweetness_levels(result, sweetness_pct, source="manual")
                         st.rerun()
 
         # Display results if they exist (using the standard display function)
@@ -493,10 +601,10 @@ elif st.session_state.page == "camera":
     if img:
         st.subheader(t['preview'])
         
-        multiplier = 1.0
+        sweetness_pct = 100
         if st.session_state.mode == "Fresh Drinks":
             st.markdown(t['adjust_sweet'])
-            sweetness_pct = st.slider(t['slider_label'], min_value=0, max_value=150, value=100, step=25, key="cam_slider", on_change=clear_results)
+            sweetness_pct = st.slider(t['slider_label'], min_value=0, max_value=150, value=100, step=25, key="cam_slider", on_change=apply_sweetness, args=("cam_slider",))
             
             if sweetness_pct == 0: label = t['s_no']
             elif sweetness_pct == 25: label = t['s_less25']
@@ -505,21 +613,15 @@ elif st.session_state.page == "camera":
             elif sweetness_pct == 100: label = t['s_std']
             else: label = t['s_extra'].format(sweetness_pct)
             st.caption(f"{t['selected']}: **{label}**")
-            
-            multiplier = sweetness_pct / 100.0
 
         st.write("---")
+        force_fresh = st.checkbox(t['force_fresh'], key="cam_force_fresh")
         if st.button(t['btn_analyze_bev'], type="primary", use_container_width=True):
              # Get translated mode name
-             mode_key_map = {
-                 "Nutrition Label": "tab_label",
-                 "Fresh Drinks": "tab_fresh",
-                 "Menu Scan": "tab_menu"
-             }
-             mode_trans = t[mode_key_map.get(st.session_state.mode, "tab_label")]
+             mode_trans = t[MODE_KEYS.get(st.session_state.mode, "tab_label")]
              
              with st.spinner(t['spinner_analyze'].format(mode_trans)):
-                perform_analysis(img, multiplier)
+                perform_analysis(img, sweetness_pct, force_fresh)
         
         # Display results if they exist
         display_scan_results(key_prefix="cam_result")
@@ -554,10 +656,10 @@ elif st.session_state.page == "upload":
         st.subheader(t['preview'])
         st.image(img, width=350)
         
-        multiplier = 1.0
+        sweetness_pct = 100
         if st.session_state.mode == "Fresh Drinks":
             st.markdown(t['adjust_sweet'])
-            sweetness_pct = st.slider(t['slider_label'], min_value=0, max_value=150, value=100, step=25, key="up_slider", on_change=clear_results)
+            sweetness_pct = st.slider(t['slider_label'], min_value=0, max_value=150, value=100, step=25, key="up_slider", on_change=apply_sweetness, args=("up_slider",))
             
             if sweetness_pct == 0: label = t['s_no']
             elif sweetness_pct == 25: label = t['s_less25']
@@ -566,21 +668,15 @@ elif st.session_state.page == "upload":
             elif sweetness_pct == 100: label = t['s_std']
             else: label = t['s_extra'].format(sweetness_pct)
             st.caption(f"{t['selected']}: **{label}**")
-            
-            multiplier = sweetness_pct / 100.0
 
         st.write("---")
+        force_fresh = st.checkbox(t['force_fresh'], key="up_force_fresh")
         if st.button(t['btn_analyze_bev'], type="primary", use_container_width=True):
             # Get translated mode name
-            mode_key_map = {
-                "Nutrition Label": "tab_label",
-                "Fresh Drinks": "tab_fresh",
-                "Menu Scan": "tab_menu"
-            }
-            mode_trans = t[mode_key_map.get(st.session_state.mode, "tab_label")]
+            mode_trans = t[MODE_KEYS.get(st.session_state.mode, "tab_label")]
 
             with st.spinner(t['spinner_analyze'].format(mode_trans)):
-                perform_analysis(img, multiplier)
+                perform_analysis(img, sweetness_pct, force_fresh)
         
         # Display results if they exist
         display_scan_results(key_prefix="up_result")
\ No newline at end of file
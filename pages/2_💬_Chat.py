@@ -1,6 +1,9 @@
 import streamlit as st
+import itertools
+import uuid
 # Import the logic functions from our service file
-from services.jamai_service import chat_with_jamai
+from services.jamai_service import stream_chat_with_jamai, persona_prompt, take_prefetched_chat
+from services.transcript import get_transcript_store, clear_on_session_end
 
 # --- TRANSLATIONS ---
 TRANS = {
@@ -15,7 +18,8 @@ TRANS = {
         "agent_makcik": "👵 Mak Cik Manis",
         "init_prof": "Hello! I am Prof. Manis. I can help you analyze your sugar intake scientifically. How can I assist you today?",
         "init_makcik": "Haiya, hello! I am Mak Cik Manis. Don't drink so much sugar ah, later get diabetes! What you want to ask?",
-        "clear_chat": "Clear Chat"
+        "clear_chat": "Clear Chat",
+        "load_earlier": "⬆️ Show earlier messages ({} more)"
     },
     "Malay": {
         "page_title": "Chatbot JamAI",
@@ -28,7 +32,8 @@ TRANS = {
         "agent_makcik": "👵 Mak Cik Manis",
         "init_prof": "Helo! Saya Prof. Manis. Saya boleh bantu anda analisis pengambilan gula secara saintifik. Apa yang boleh saya bantu?",
         "init_makcik": "Haa, helo! Mak Cik Manis sini. Jangan minum manis sangat woi, nanti kena kencing manis! Nak tanya apa tu?",
-        "clear_chat": "Padam Sembang"
+        "clear_chat": "Padam Sembang",
+        "load_earlier": "⬆️ Tunjuk mesej terdahulu ({} lagi)"
     }
 }
 
@@ -44,6 +49,29 @@ if 'intro_shown' in st.session_state:
 
 st.set_page_config(page_title=t['page_title'], page_icon="🤖", layout="wide")
 
+# --- TRANSCRIPT WINDOW ---
+# Only the latest CHAT_WINDOW messages are rendered and kept in session_state;
+# the whole conversation lives in the transcript store and is paged in on demand.
+CHAT_WINDOW = 20
+
+transcript = get_transcript_store()
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = uuid.uuid4().hex
+clear_on_session_end(transcript, st.session_state.chat_session_id)
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW
+
+def remember_message(role, content):
+    """Saves one turn to the transcript store and keeps only the latest window in session_state."""
+    seq = transcript.append(st.session_state.chat_session_id, role, content)
+    st.session_state.messages.append({"role": role, "content": content, "seq": seq})
+    del st.session_state.messages[:-CHAT_WINDOW]
+
+def reset_chat():
+    transcript.clear(st.session_state.chat_session_id)
+    st.session_state.messages = []
+    st.session_state.chat_window = CHAT_WINDOW
+
 st.markdown("""
 <style>
 /* GENERAL LAYOUT */
@@ -190,13 +218,13 @@ if "last_agent" not in st.session_state:
     st.session_state.last_agent = agent_choice
 
 if st.session_state.last_agent != agent_choice:
-    st.session_state.messages = []
+    reset_chat()
     st.session_state.last_agent = agent_choice
     st.rerun()
 
 with c_clear:
     if st.button(t['clear_chat'], use_container_width=True):
-        st.session_state.messages = []
+        reset_chat()
         st.rerun()
     st.markdown('<span class="clear-btn-marker"></span>', unsafe_allow_html=True)
 
@@ -208,7 +236,7 @@ if "messages" not in st.session_state:
 
 # Add initial message if history is empty
 if not st.session_state.messages:
-    st.session_state.messages.append({"role": "assistant", "content": init_msg})
+    remember_message("assistant", init_msg)
 
 # Helper to display message with styling
 def display_message(role, content):
@@ -219,8 +247,45 @@ def display_message(role, content):
         with st.chat_message("assistant", avatar=agent_avatar):
             st.markdown(f'<span class="bot-marker"></span>{content}', unsafe_allow_html=True)
 
-# 2. Display Existing Chat History
-for message in st.session_state.messages:
+# Helper to stream the AI reply into its bubble as it is generated
+# (use_cache=False for prompts about the user's own scan, never shared;
+#  prefetched = the answer already being generated in the background, if any)
+def display_streamed_reply(final_prompt, use_cache=True, prefetched=None):
+    with st.chat_message("assistant", avatar=agent_avatar):
+        st.markdown('<span class="bot-marker"></span>', unsafe_allow_html=True)
+        if prefetched is not None:
+            try:
+                with st.spinner(t['spinner']):
+                    response = prefetched.result()
+                st.markdown(response)
+                return response
+            except Exception:
+                pass # Prefetch failed or was cancelled: ask again below
+        try:
+            stream = stream_chat_with_jamai(final_prompt, table_id=current_table_id, language=lang, use_cache=use_cache)
+            # Spinner only until the first token arrives
+            with st.spinner(t['spinner']):
+                first_chunk = next(stream, "")
+            response = st.write_stream(itertools.chain([first_chunk], stream))
+        except Exception as e:
+            response = t['error'].format(e)
+            st.markdown(response)
+    return response
+
+# 2. Display Existing Chat History (latest window, earlier pages on demand)
+recent = st.session_state.messages
+older = []
+extra = st.session_state.chat_window - len(recent)
+if extra > 0 and recent and "seq" in recent[0]:
+    older = transcript.page(st.session_state.chat_session_id, before=recent[0]["seq"], limit=extra)
+
+hidden = transcript.count(st.session_state.chat_session_id) - len(older) - len(recent)
+if hidden > 0:
+    if st.button(t['load_earlier'].format(hidden), type="secondary"):
+        st.session_state.chat_window += CHAT_WINDOW
+        st.rerun()
+
+for message in older + recent:
     display_message(message["role"], message["content"])
 
 # 3. Handle Auto-Prompt from Scanner
@@ -230,43 +295,28 @@ if 'chat_prompt' in st.session_state and st.session_state.chat_prompt:
     
     # A. Display User Message
     display_message("user", auto_prompt)
-    st.session_state.messages.append({"role": "user", "content": auto_prompt})
+    remember_message("user", auto_prompt)
 
     # Prepare prompt for AI (Add hidden instruction for Mak Cik in English mode)
-    final_prompt = auto_prompt
-    if lang == "English" and current_table_id == "chat2":
-        final_prompt = f"{auto_prompt} (Please answer in English)"
+    final_prompt = persona_prompt(auto_prompt, current_table_id, lang)
 
-    # B. Call Backend Logic
-    with st.spinner(t['spinner']):
-        try:
-            response = chat_with_jamai(final_prompt, table_id=current_table_id, language=lang)
-        except Exception as e:
-            response = t['error'].format(e)
-
-    # C. Display AI Response
-    display_message("assistant", response)
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    # B. Call Backend Logic + C. Stream AI Response (scan-specific, so not cached;
+    #    usually already answered in the background while the scan was on screen)
+    prefetched = take_prefetched_chat(auto_prompt, current_table_id, lang)
+    response = display_streamed_reply(final_prompt, use_cache=False, prefetched=prefetched)
+    remember_message("assistant", response)
     st.rerun()
 
 # 4. Handle New User Input
 if prompt := st.chat_input(t['input_ph']):
     # A. Display User Message
+    st.session_state.chat_window = CHAT_WINDOW # Back to the latest messages
     display_message("user", prompt)
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    remember_message("user", prompt)
 
     # Prepare prompt for AI (Add hidden instruction for Mak Cik in English mode)
-    final_prompt = prompt
-    if lang == "English" and current_table_id == "chat2":
-        final_prompt = f"{prompt} (Please answer in English)"
-
-    # B. Call Backend Logic (The "Simplified" part)
-    with st.spinner(t['spinner']):
-        try:
-            response = chat_with_jamai(final_prompt, table_id=current_table_id, language=lang)
-        except Exception as e:
-            response = t['error'].format(e)
+    final_prompt = persona_prompt(prompt, current_table_id, lang)
 
-    # C. Display AI Response
-    display_message("assistant", response)
-    st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+    # B. Call Backend Logic (The "Simplified" part) + C. Stream AI Response
+    response = display_streamed_reply(final_prompt)
+    remember_message("assistant", response)
\ No newline at end of file
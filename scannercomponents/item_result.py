@@ -3,6 +3,8 @@ import os
 from scannercomponents.nutrigrade import get_nutrigrade_html
 from scannercomponents.sugarcube import display_sugarcube_visual
 from scannercomponents.fatvisual import display_fat_visual
+from services.jamai_service import prefetch_chat_answers
+from utils.components import rerun_fragment
 
 # --- TRANSLATIONS ---
 TRANS = {
@@ -36,9 +38,10 @@ TRANS = {
     }
 }
 
-def show_single_item_result(data, image_file, on_confirm_callback=None, key_prefix="item"):
+def show_single_item_result(data, image_file, on_confirm_callback=None, key_prefix="item", result_id=None):
     """
     Displays the full Result Card for a single scanned item.
+    result_id identifies the scan, so its Ask AI answers are prefetched once.
     """
     # Get Language
     lang = st.session_state.get('lang', 'English')
@@ -103,6 +106,27 @@ def show_single_item_result(data, image_file, on_confirm_callback=None, key_pref
 
     st.write("") 
 
+    prompt = t['prompt_template'].format(
+        name=data['name'],
+        grade=data.get('grade', 'C'),
+        sugar=data.get('sugar_100g', 0),
+        fat=data.get('fat_100g', 0)
+    )
+
+    # Start both advisors' answers once the card settles, so the Chat page has one ready
+    prefetch_chat_answers(prompt, lang, result_id)
+
+    show_item_actions(data, prompt, on_confirm_callback, key_prefix)
+
+@st.fragment
+def show_item_actions(data, prompt, on_confirm_callback=None, key_prefix="item"):
+    """
+    The result card's buttons. A fragment: pressing one redraws only these
+    buttons, not the card above or the rest of the page.
+    """
+    lang = st.session_state.get('lang', 'English')
+    t = TRANS[lang]
+
     # State for alternative button
     alt_key = f"{key_prefix}_show_alt"
     if alt_key not in st.session_state:
@@ -126,14 +150,14 @@ def show_single_item_result(data, image_file, on_confirm_callback=None, key_pref
             on_confirm_callback(data['sugar_g'], data['fat_g'])
         else:
             st.success(t['msg_added'].format(data['name']))
-        st.rerun()
+        rerun_fragment()
 
     if st.button(t['btn_find_alt'], use_container_width=True, key=f"{key_prefix}_btn_alt", disabled=alt_disabled):
         st.session_state[alt_key] = True
-        st.rerun()
+        rerun_fragment()
         
     if st.session_state[alt_key]:
-        st.info(f"{t['alt_title']}\n\n{data.get('alternative', t['alt_none'])}")
+        st.info(f"{t['alt_title']}\n\n{data.get('alternative') or t['alt_none']}")
 
     # New Button: Ask AI
     st.markdown("<div style='margin-top: 10px;'></div>", unsafe_allow_html=True)
@@ -165,18 +189,11 @@ def show_single_item_result(data, image_file, on_confirm_callback=None, key_pref
 
     if st.button(t['btn_ask_ai'], use_container_width=True, key=f"{key_prefix}_btn_ask_ai"):
         st.session_state[ask_ai_key] = not st.session_state[ask_ai_key]
-        st.rerun()
+        rerun_fragment()
 
     if st.session_state[ask_ai_key]:
         st.markdown(f"##### {t['choose_advisor']}")
         c1, c2 = st.columns(2)
-        
-        prompt = t['prompt_template'].format(
-            name=data['name'],
-            grade=data.get('grade', 'C'),
-            sugar=data.get('sugar_100g', 0),
-            fat=data.get('fat_100g', 0)
-        )
 
         with c1:
             if st.button("👨‍⚕️ Prof. Manis", use_container_width=True, key=f"{key_prefix}_ask_prof"):
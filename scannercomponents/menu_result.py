@@ -1,5 +1,7 @@
 import streamlit as st
 from scannercomponents.nutrigrade import get_nutrigrade_html
+from services.jamai_service import prefetch_chat_answers
+from utils.components import rerun_fragment
 
 # --- TRANSLATIONS ---
 TRANS = {
@@ -33,9 +35,11 @@ TRANS = {
     }
 }
 
-def show_menu_result(menu_items, on_add_multiple_callback=None):
+def show_menu_result(menu_items, on_add_multiple_callback=None, prefetch_ai=True, result_id=None):
     """
     Displays the list of items found in a menu.
+    prefetch_ai=False while the list is still growing (the Ask AI prompt is not final yet);
+    result_id identifies the scan, so its Ask AI answers are prefetched once.
     """
     # Get Language
     lang = st.session_state.get('lang', 'English')
@@ -68,12 +72,41 @@ def show_menu_result(menu_items, on_add_multiple_callback=None):
             </div>
         </div>
         """, unsafe_allow_html=True)
+
+    # Checkboxes are keyed by position in the menu, not in the sorted list,
+    # so a ticked drink stays ticked when items arriving later re-sort the list
+    order = sorted(range(len(menu_items)), key=lambda i: menu_items[i]['grade'])
+    sorted_items = [menu_items[i] for i in order]
+
+    show_menu_selector(sorted_items, order, sugar_icon_html, fat_icon_html, on_add_multiple_callback)
+
+    # Construct prompt
+    item_names = [item['name'] for item in sorted_items]
+    item_grades = [item['grade'] for item in sorted_items]
+    
+    names_str = ", ".join(item_names)
+    grades_str = ", ".join(item_grades)
     
+    prompt = t['prompt_template'].format(names=names_str, grades=grades_str)
+
+    # Start both advisors' answers once the list settles, so the Chat page has one ready
+    if prefetch_ai:
+        prefetch_chat_answers(prompt, lang, result_id)
+
+    show_menu_ask_ai(prompt)
+
+@st.fragment
+def show_menu_selector(sorted_items, order, sugar_icon_html, fat_icon_html, on_add_multiple_callback=None):
+    """
+    The drink list with its checkboxes and totals. A fragment: ticking a
+    drink redraws only this list, not the rest of the page.
+    """
+    lang = st.session_state.get('lang', 'English')
+    t = TRANS[lang]
+
     if 'selected_menu_indices' not in st.session_state:
         st.session_state['selected_menu_indices'] = []
 
-    sorted_items = sorted(menu_items, key=lambda x: x['grade'])
-
     selected_indices = []
     
     for idx, item in enumerate(sorted_items):
@@ -82,7 +115,7 @@ def show_menu_result(menu_items, on_add_multiple_callback=None):
             
             with c1:
                 # The actual Checkbox
-                is_selected = st.checkbox(t['select_btn'], key=f"menu_item_{idx}", label_visibility="hidden")
+                is_selected = st.checkbox(t['select_btn'], key=f"menu_item_{order[idx]}", label_visibility="hidden")
                 if is_selected:
                     selected_indices.append(idx)
             
@@ -122,7 +155,7 @@ def show_menu_result(menu_items, on_add_multiple_callback=None):
     with col_a:
         if st.button(t['btn_clear'], use_container_width=True):
             st.session_state['selected_menu_indices'] = []
-            st.rerun()
+            rerun_fragment()
 
     with col_b:
         if count > 0:
@@ -132,6 +165,12 @@ def show_menu_result(menu_items, on_add_multiple_callback=None):
                 else:
                     st.success(t['msg_added'].format(total_sugar, total_fat))
 
+@st.fragment
+def show_menu_ask_ai(prompt):
+    """The Ask AI button and advisor choice; toggling it redraws only this part."""
+    lang = st.session_state.get('lang', 'English')
+    t = TRANS[lang]
+
     # --- Ask AI Button ---
     st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
     
@@ -161,20 +200,11 @@ def show_menu_result(menu_items, on_add_multiple_callback=None):
 
     if st.button(t['btn_ask_ai'], use_container_width=True, key="menu_btn_ask_ai"):
         st.session_state[ask_ai_key] = not st.session_state[ask_ai_key]
-        st.rerun()
+        rerun_fragment()
 
     if st.session_state[ask_ai_key]:
         st.markdown(f"##### {t['choose_advisor']}")
         c1, c2 = st.columns(2)
-        
-        # Construct prompt
-        item_names = [item['name'] for item in sorted_items]
-        item_grades = [item['grade'] for item in sorted_items]
-        
-        names_str = ", ".join(item_names)
-        grades_str = ", ".join(item_grades)
-        
-        prompt = t['prompt_template'].format(names=names_str, grades=grades_str)
 
         with c1:
             if st.button("👨‍⚕️ Prof. Manis", use_container_width=True, key="menu_ask_prof", type="secondary"):
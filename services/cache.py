@@ -0,0 +1,268 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from services.text_utils import normalize_question, question_keywords, char_ngrams, dice_similarity
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# All caches live in one folder outside the project so they survive restarts
+# and are shared by every session (and every server process on the machine).
+CACHE_DIR = os.environ.get("CEKMANIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cekmanis_cache"))
+
+# ==========================================
+# 💾 PERSISTENT LRU CACHE
+# ==========================================
+class PersistentCache:
+    """
+    Bounded LRU cache with an optional TTL, persisted in a SQLite file.
+    Values must be JSON-serialisable. Safe to share between threads.
+    """
+
+    def __init__(self, name, max_entries=1000, ttl=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.name = name
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds, or None to keep entries until evicted
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default on a miss / expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return default
+
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Stores value under key and evicts the least recently used overflow."""
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        """Removes a single entry. Returns True if it existed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def delete_prefix(self, prefix):
+        """Removes every entry whose key starts with prefix. Returns the number removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def clear(self):
+        """Removes every entry. Returns the number of entries removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+        return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+# ==========================================
+# 👯 NEAR-DUPLICATE INDEX
+# ==========================================
+class NearDuplicateIndex:
+    """
+    In-memory index of recently analyzed images by perceptual hash (int bits).
+    Lookups scan the (small, bounded) recent window per scope and return the
+    closest entry within max_distance bits. Safe to share between threads.
+    """
+
+    def __init__(self, max_distance=6, max_entries=200, ttl=30 * 60):
+        self.max_distance = max_distance
+        self.max_entries = max_entries  # Per scope (e.g. scan mode + language)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # scope -> list of (hash, created, value), oldest first
+
+    def find(self, scope, image_hash, confirm=None):
+        """
+        Returns the stored value closest to image_hash, or None if nothing is
+        near enough. With confirm, candidates are tried closest first and only
+        a value for which confirm(value) is true is returned.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [e for e in self._entries.get(scope, []) if now - e[1] <= self.ttl]
+            self._entries[scope] = entries
+
+            candidates = []
+            for stored_hash, _, value in entries:
+                distance = (stored_hash ^ image_hash).bit_count()  # Hamming distance
+                if distance <= self.max_distance:
+                    candidates.append((distance, value))
+
+        # Confirmation may be slow (e.g. decoding images), so it runs outside the lock
+        match = next((v for _, v in sorted(candidates, key=lambda c: c[0]) if confirm is None or confirm(v)), None)
+        with self._lock:
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return match
+
+    def add(self, scope, image_hash, value):
+        """Remembers value for image_hash, dropping the oldest entries past max_entries."""
+        with self._lock:
+            entries = self._entries.setdefault(scope, [])
+            entries.append((image_hash, time.time(), value))
+            del entries[:-self.max_entries]
+
+# ==========================================
+# 💬 SIMILAR-QUESTION CACHE
+# ==========================================
+class SimilarityCache:
+    """
+    In-memory answer cache keyed by similar rather than identical questions.
+    Questions are normalized (normalize_question) and compared as character
+    trigram sets; the closest stored question with the same key words
+    (question_keywords: drinks, negations, numbers) and a Dice score of at
+    least min_score answers. LRU + TTL per scope (e.g. persona table +
+    language). Safe to share between threads.
+    """
+
+    def __init__(self, name, min_score=0.93, max_entries=500, ttl=24 * 60 * 60):
+        self.name = name
+        self.min_score = min_score
+        self.max_entries = max_entries  # Per scope
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # scope -> OrderedDict(normalized question -> (grams, keywords, created, value)), oldest first
+
+    def get(self, scope, question):
+        """Returns the answer stored for the most similar question, or None."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(scope, OrderedDict())
+            for stale in [k for k, (_, _, created, _) in entries.items() if now - created > self.ttl]:
+                del entries[stale]
+
+            # 1. Same normalized question, else 2. the closest one with the same key words above min_score
+            best_key = key if key in entries else None
+            if best_key is None and key:
+                grams = char_ngrams(key)
+                keywords = question_keywords(key)
+                best_score = self.min_score
+                for stored_key, (stored_grams, stored_keywords, _, _) in entries.items():
+                    if stored_keywords != keywords:
+                        continue
+                    score = dice_similarity(grams, stored_grams)
+                    if score >= best_score:
+                        best_key, best_score = stored_key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(best_key)
+            self.hits += 1
+            return entries[best_key][3]
+
+    def set(self, scope, question, value):
+        """Stores the answer to question, dropping the least recently used past max_entries."""
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            entries = self._entries.setdefault(scope, OrderedDict())
+            entries[key] = (char_ngrams(key), question_keywords(key), time.time(), value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry. Returns the number of entries removed."""
+        with self._lock:
+            removed = len(self)
+            self._entries.clear()
+        return removed
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+# ==========================================
+# 🛠️ ADMIN CLI
+# ==========================================
+# python -m services.cache stats
+# python -m services.cache purge <cache_name>
+# python -m services.cache purge-drink "<drink name>"
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if args == ["stats"]:
+        file_names = sorted(os.listdir(CACHE_DIR)) if os.path.isdir(CACHE_DIR) else []
+        for file_name in file_names:
+            if file_name.endswith(".sqlite3"):
+                cache = PersistentCache(file_name[:-len(".sqlite3")])
+                print(f"{cache.name}: {len(cache)} entries")
+    elif len(args) == 2 and args[0] == "purge":
+        cache = PersistentCache(args[1])
+        print(f"{cache.name}: removed {cache.clear()} entries")
+    elif len(args) == 2 and args[0] == "purge-drink":
+        # Same keys as the app (needs .streamlit/secrets.toml for the project id)
+        from services.jamai_service import purge_manual_cache
+        print(f"manual_lookups: removed {purge_manual_cache(args[1])} entries")
+    else:
+        print('usage: python -m services.cache stats | purge <cache_name> | purge-drink "<drink name>"')
+        sys.exit(1)
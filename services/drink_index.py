@@ -0,0 +1,136 @@
+import os
+import re
+import streamlit as st
+from services.text_utils import normalize_drink_name, char_ngrams, dice_similarity
+from services.estimator import MILK_WORDS, NO_MILK_WORDS, MILK_FAT_100ML
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# 1. Dataset (the JamAI knowledge table export shipped with the repo)
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "JamAI", "Dataset.parquet")
+DATASET_TEXT_COLUMN = "Text"  # Markdown table rows: | Beverage | Sugar | Saturated Fat | Source |
+
+# 2. Plausibility Filter
+# A few rows are per 100g of powder or per cup, not per 100ml; those are left to the LLM.
+MAX_SUGAR_100ML = 20.0
+
+# 3. Fuzzy Matching
+FUZZY_MIN_SCORE = 0.8  # Dice similarity of character trigrams needed to trust a fuzzy match
+
+# ==========================================
+# 📚 DRINK INDEX
+# ==========================================
+def _number(cell):
+    """'7.4' -> 7.4; '—' / '' -> None."""
+    match = re.search(r"\d+(\.\d+)?", cell)
+    return float(match.group()) if match else None
+
+def _aliases(name):
+    """Normalized names a user might type for one dataset row."""
+    aliases = {normalize_drink_name(name)}
+
+    # "Teh Tarik (mamak‑style)" -> "Teh Tarik"
+    plain = re.sub(r"\([^)]*\)", " ", name)
+    aliases.add(normalize_drink_name(plain))
+
+    # "PlayMade – Taro Milk Tea" / "Starbucks - Caffè Latte" -> "Taro Milk Tea" / "Caffè Latte"
+    parts = re.split(r"\s+[–-]\s+", plain, maxsplit=1)
+    if len(parts) == 2:
+        aliases.add(normalize_drink_name(parts[1]))
+
+    # "NESTLE, MILO, ORIGINAL MINUMAN MALT COKLAT, CAN" -> "MILO ORIGINAL MINUMAN MALT COKLAT"
+    segments = [s for s in plain.split(",") if s.strip()]
+    if len(segments) >= 3:
+        aliases.add(normalize_drink_name(" ".join(segments[1:-1])))
+
+    aliases.discard("")
+    return aliases
+
+class DrinkIndex:
+    """
+    Known drinks from Dataset.parquet, looked up by normalized name (hash map)
+    with a character-trigram fallback for near spellings.
+    """
+
+    def __init__(self, path=DATASET_PATH):
+        self.entries = []   # [{"name", "sugar_100g", "fat_100g"}]
+        self.by_name = {}   # normalized alias -> entry index
+        self._grams = []    # (alias trigrams, entry index)
+        self._postings = {} # trigram -> set of positions in self._grams
+
+        # 1. Read only the text column, memory-mapped (no copy of the embeddings)
+        import pyarrow.parquet as pq  # Deferred: only needed while the index is built
+        table = pq.read_table(path, columns=[DATASET_TEXT_COLUMN], memory_map=True)
+
+        # 2. Parse Markdown Table Rows
+        for chunk in table.column(DATASET_TEXT_COLUMN).to_pylist():
+            for line in (chunk or "").splitlines():
+                cells = [c.strip() for c in line.strip().strip("|").split("|")]
+                if len(cells) < 3 or cells[0] in ("", "Beverage") or set(cells[0]) <= set("-:"):
+                    continue
+                self._add(cells[0], _number(cells[1]), _number(cells[2]))
+
+    def _add(self, name, sugar_100, fat_100):
+        if sugar_100 is None or sugar_100 > MAX_SUGAR_100ML:
+            return
+
+        # Unknown fat: assume typical condensed-milk fat for milky drinks, else none
+        if fat_100 is None:
+            words = normalize_drink_name(name).split()
+            has_milk = any(w in MILK_WORDS for w in words) and not any(w in NO_MILK_WORDS for w in words)
+            fat_100 = MILK_FAT_100ML if has_milk else 0.0
+
+        index = len(self.entries)
+        self.entries.append({"name": name, "sugar_100g": sugar_100, "fat_100g": fat_100})
+        for alias in _aliases(name):
+            # First row wins for duplicate names (e.g. two "Teh Tarik" sources)
+            if alias in self.by_name:
+                continue
+            self.by_name[alias] = index
+            grams = char_ngrams(alias)
+            position = len(self._grams)
+            self._grams.append((grams, index))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(position)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, text):
+        """
+        Returns the dataset entry for a typed drink name, or None if unknown.
+        Exact normalized match first, then the closest trigram match above FUZZY_MIN_SCORE.
+        """
+        key = normalize_drink_name(text)
+        if not key:
+            return None
+
+        # 1. Exact (Normalized) Match
+        if key in self.by_name:
+            return self.entries[self.by_name[key]]
+
+        # 2. Fuzzy Match: score only aliases sharing at least one trigram
+        grams = char_ngrams(key)
+        candidates = set()
+        for gram in grams:
+            candidates |= self._postings.get(gram, set())
+
+        best_score, best_index = 0.0, None
+        for position in candidates:
+            alias_grams, index = self._grams[position]
+            score = dice_similarity(grams, alias_grams)
+            if score > best_score:
+                best_score, best_index = score, index
+
+        if best_score >= FUZZY_MIN_SCORE:
+            return self.entries[best_index]
+        return None
+
+@st.cache_resource(show_spinner=False)
+def load_drink_index():
+    """Loads the drink index once per server process (None if the dataset is missing)."""
+    try:
+        return DrinkIndex()
+    except (OSError, ValueError, KeyError):
+        return None
@@ -0,0 +1,65 @@
+from services.text_utils import normalize_drink_name
+from utils.grading import nutrigrade, SERVING_ML
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# 1. Typical Sugar per 250ml Serving at Standard Sweetness (grams)
+# Rough mamak / kopitiam figures, first match wins.
+SODA_WORDS = ["coke", "cola", "pepsi", "100", "sprite", "7up", "sarsi", "f&n", "fanta"]
+BASE_SUGAR = [
+    (SODA_WORDS, 35),
+    (["teh"], 24),
+    (["kopi"], 18),
+    (["milo"], 20),
+]
+DEFAULT_SUGAR = 30
+
+# 2. Saturated Fat per 100ml for Milky Drinks (condensed / evaporated milk)
+MILK_WORDS = ["tarik", "susu", "c", "milo", "latte", "cham"]
+NO_MILK_WORDS = ["o", "kosong"]
+MILK_FAT_100ML = 1.2
+
+# 3. Labels shown with every estimate
+ESTIMATE_COMMENT = {
+    "English": "⚠️ Offline estimate: JamAI is unavailable right now, so these values are a rough guess from the drink name. Please re-check later.",
+    "Malay": "⚠️ Anggaran luar talian: JamAI tidak tersedia sekarang, jadi nilai ini hanyalah tekaan kasar berdasarkan nama minuman. Sila semak semula nanti.",
+}
+
+# ==========================================
+# 🧮 LOCAL ESTIMATOR (DEGRADED MODE)
+# ==========================================
+def estimate_drink(drink_name, multiplier=1.0, language="English"):
+    """
+    Keyword-based guess of a drink's sugar and fat, used only when JamAI is
+    down. Returns the same dict shape as the analyzers, flagged "estimated".
+    """
+    words = normalize_drink_name(drink_name).split()
+    text = " ".join(words)
+
+    # 1. Base Sugar by Drink Family
+    base_sugar = DEFAULT_SUGAR
+    for keywords, sugar in BASE_SUGAR:
+        if any(k in words or (len(k) > 3 and k in text) for k in keywords):
+            base_sugar = sugar
+            break
+
+    # 2. Sweetness + Milk
+    sugar_g = base_sugar * multiplier
+    has_milk = any(w in MILK_WORDS for w in words) and not any(w in NO_MILK_WORDS for w in words)
+    fat_100 = MILK_FAT_100ML if has_milk else 0.0
+
+    sugar_100 = sugar_g * 100 / SERVING_ML
+    return {
+        "name": f"{drink_name}",
+        "grade": nutrigrade(sugar_100, fat_100),
+        "sugar_g": sugar_g,
+        "fat_g": fat_100 * SERVING_ML / 100,
+        "sugar_100g": sugar_100,
+        "fat_100g": fat_100,
+        "comment": ESTIMATE_COMMENT.get(language, ESTIMATE_COMMENT["English"]),
+        "alternative": "",
+        "is_beverage": True,
+        "serving_text": f"({SERVING_ML}ml)",
+        "estimated": True
+    }
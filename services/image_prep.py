@@ -0,0 +1,255 @@
+import io
+import os
+import math
+import hashlib
+import streamlit as st
+from PIL import Image, ImageChops, ImageOps, UnidentifiedImageError
+from services.cache import NearDuplicateIndex
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# 1. Target Resolution per Scan Mode (longest side in pixels)
+# A menu has many small lines of text; a single drink only needs its shape and colour.
+MAX_SIDE = {
+    "label": 1600,
+    "drink": 1024,
+    "menu": 2048,
+}
+
+# 2. JPEG Quality per Scan Mode
+JPEG_QUALITY = {
+    "label": 85,
+    "drink": 80,
+    "menu": 85,
+}
+
+# 3. Memo of prepared images (same photo + mode -> same bytes, no re-encode)
+PREP_CACHE_SIZE = 64
+
+# 4. Perceptual Hash (dHash) size: HASH_SIZE x HASH_SIZE bits
+HASH_SIZE = 16
+
+# 5. Near-Duplicate Scans (reuse a recent result of this session for the same picture)
+# The hash only picks candidates: labels that differ in one digit hash the same.
+# A candidate is reused only if its prepared image also passes the pixel check.
+NEAR_DUPLICATE_MAX_DISTANCE = 8   # Differing hash bits (out of 256); re-encoding flips ~3
+NEAR_DUPLICATE_BLOCK = 16         # Pixel check compares the mean of each 16x16 block...
+NEAR_DUPLICATE_MAX_BLOCK_DIFF = 20  # ...in grey levels: JPEG noise ~9, a changed digit 50+
+NEAR_DUPLICATE_WINDOW = 20        # Recent scans remembered per session, mode + language
+NEAR_DUPLICATE_TTL = 30 * 60      # Seconds
+
+# 6. Menu Tiles (big menus are read as overlapping tiles, analyzed in parallel)
+MENU_TILE_SIDE = 1024      # Target tile side in pixels; tiles are cut from the prepared menu
+MENU_TILE_OVERLAP = 0.15   # Fraction of a tile shared with its neighbour, so no line is cut off
+MENU_MAX_TILES = 6         # Tiles grow instead of multiplying past this
+
+# ==========================================
+# 🖼️ PREPARED IMAGE
+# ==========================================
+class PreparedImage(io.BytesIO):
+    """
+    In-memory JPEG that can be passed anywhere a Streamlit UploadedFile is
+    used by the service (getbuffer() + name), plus the size it saved.
+    """
+    def __init__(self, data, name, original_bytes):
+        super().__init__(data)
+        self.name = name
+        self.original_bytes = original_bytes
+        self.prepared_bytes = len(data)
+
+    @property
+    def bytes_saved(self):
+        return max(0, self.original_bytes - self.prepared_bytes)
+
+def _encode(data, profile):
+    """Orients, strips, downscales and re-encodes one image. Returns JPEG bytes."""
+    with Image.open(io.BytesIO(data)) as img:
+        # 1. Apply EXIF Orientation (phones store portrait shots sideways)
+        # (exif_transpose always returns a copy, so read the tag to know if it turned anything)
+        rotated = img.getexif().get(0x0112, 1) != 1
+        oriented = ImageOps.exif_transpose(img)
+
+        # 2. Flatten Transparency onto White (JPEG has no alpha)
+        if oriented.mode in ("RGBA", "LA", "P"):
+            rgba = oriented.convert("RGBA")
+            oriented = Image.new("RGB", rgba.size, (255, 255, 255))
+            oriented.paste(rgba, mask=rgba.getchannel("A"))
+        elif oriented.mode != "RGB":
+            oriented = oriented.convert("RGB")
+
+        # 3. Downscale to the Mode's Target Resolution
+        max_side = MAX_SIDE[profile]
+        resized = max(oriented.size) > max_side
+        if resized:
+            oriented.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        # 4. Re-encode (no EXIF/ICC/XMP is passed on, so metadata is stripped)
+        out = io.BytesIO()
+        oriented.save(out, format="JPEG", quality=JPEG_QUALITY[profile], optimize=True, progressive=True)
+
+    encoded = out.getvalue()
+
+    # 5. Keep the original if re-encoding an already small, upright JPEG made it bigger
+    if not rotated and not resized and len(encoded) >= len(data) and data[:2] == b"\xff\xd8":
+        return bytes(data)
+    return encoded
+
+@st.cache_data(max_entries=PREP_CACHE_SIZE, show_spinner=False)
+def _encode_cached(digest, profile, _data):
+    """Memoized _encode, keyed by the original image's hash (data itself is not hashed again)."""
+    return _encode(_data, profile)
+
+def prepare_image(uploaded_file, profile):
+    """
+    Prepares a camera/gallery image for upload in the given scan profile
+    ("label", "drink" or "menu"). Returns a PreparedImage; images Pillow
+    cannot read are passed through unchanged.
+    """
+    if isinstance(uploaded_file, PreparedImage):
+        return uploaded_file
+
+    data = uploaded_file.getbuffer()
+    try:
+        digest = hashlib.sha256(data).hexdigest()
+        prepared = _encode_cached(digest, profile, bytes(data))
+    except (UnidentifiedImageError, OSError, ValueError):
+        return uploaded_file
+
+    stem = os.path.splitext(os.path.basename(uploaded_file.name))[0] or "image"
+    return PreparedImage(prepared, f"{stem}.jpg", len(data))
+
+# ==========================================
+# 🧩 MENU TILES
+# ==========================================
+def _tile_starts(length, tile):
+    """Evenly spaced tile offsets along one side, overlapping by at least MENU_TILE_OVERLAP."""
+    if length <= tile:
+        return [0], length
+    step = tile * (1 - MENU_TILE_OVERLAP)
+    count = math.ceil((length - tile) / step) + 1
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)], tile
+
+def _tile_boxes(width, height):
+    """Crop boxes (left, top, right, bottom) covering the image, at most MENU_MAX_TILES of them."""
+    side = MENU_TILE_SIDE
+    while True:
+        xs, tile_w = _tile_starts(width, side)
+        ys, tile_h = _tile_starts(height, side)
+        if len(xs) * len(ys) <= MENU_MAX_TILES:
+            break
+        side = int(side * 1.25)
+    return [(x, y, x + tile_w, y + tile_h) for y in ys for x in xs]
+
+@st.cache_data(max_entries=PREP_CACHE_SIZE, show_spinner=False)
+def _tiles_cached(digest, _data):
+    """JPEG bytes of each tile of one menu image, in reading order (memoized by hash)."""
+    with Image.open(io.BytesIO(_data)) as img:
+        # Small menus are read whole: one call is as fast as one tile
+        if max(img.size) <= MENU_TILE_SIDE * (1 + MENU_TILE_OVERLAP):
+            return [bytes(_data)]
+        img = img.convert("RGB")
+        tiles = []
+        for box in _tile_boxes(*img.size):
+            out = io.BytesIO()
+            img.crop(box).save(out, format="JPEG", quality=JPEG_QUALITY["menu"], optimize=True)
+            tiles.append(out.getvalue())
+    return tiles
+
+def split_menu_tiles(uploaded_file):
+    """
+    Cuts a menu photo into overlapping tiles (left to right, top to bottom).
+    Pass an image already prepared with the "menu" profile; small menus and
+    images Pillow cannot read come back as a single tile.
+    """
+    prepared = prepare_image(uploaded_file, "menu")
+    data = prepared.getbuffer()
+    try:
+        tiles = _tiles_cached(hashlib.sha256(data).hexdigest(), bytes(data))
+    except (UnidentifiedImageError, OSError, ValueError):
+        return [prepared]
+    if len(tiles) == 1:
+        return [prepared]
+
+    stem = os.path.splitext(os.path.basename(prepared.name))[0] or "menu"
+    return [PreparedImage(tile, f"{stem}_tile{i + 1}.jpg", len(tile)) for i, tile in enumerate(tiles)]
+
+# ==========================================
+# 👁️ PERCEPTUAL HASH
+# ==========================================
+def perceptual_hash(uploaded_file):
+    """
+    256-bit difference hash (dHash) of an image: a 17x16 grayscale thumbnail
+    where each bit says whether a pixel is brighter than its right neighbour.
+    Two encodings of the same picture differ in only a few hash bits.
+    Returns None for images Pillow cannot read.
+    """
+    try:
+        with Image.open(io.BytesIO(uploaded_file.getbuffer())) as img:
+            # 1. Let the JPEG decoder skip detail we are about to throw away
+            img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            thumb = ImageOps.exif_transpose(img).convert("L").resize(
+                (HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS
+            )
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+    # 2. One bit per horizontal gradient ("L" = one byte per pixel, row by row)
+    pixels = thumb.tobytes()
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+def same_picture(data_a, data_b):
+    """
+    Pixel check of two prepared images (JPEG bytes): same size, and no
+    NEAR_DUPLICATE_BLOCK square differs by more than NEAR_DUPLICATE_MAX_BLOCK_DIFF
+    grey levels on average. Re-encoding passes; a changed value on a label does not.
+    """
+    if data_a == data_b:
+        return True
+    try:
+        with Image.open(io.BytesIO(data_a)) as a, Image.open(io.BytesIO(data_b)) as b:
+            if a.size != b.size:
+                return False
+            diff = ImageChops.difference(a.convert("L"), b.convert("L"))
+    except (UnidentifiedImageError, OSError, ValueError):
+        return False
+
+    # Box-reduce: each pixel of the result is the mean difference of one block
+    return diff.reduce(NEAR_DUPLICATE_BLOCK).getextrema()[1] <= NEAR_DUPLICATE_MAX_BLOCK_DIFF
+
+def get_near_duplicate_index():
+    """Recent scans of this session by perceptual hash (never shared between users)."""
+    if "near_duplicate_index" not in st.session_state:
+        st.session_state.near_duplicate_index = NearDuplicateIndex(
+            max_distance=NEAR_DUPLICATE_MAX_DISTANCE,
+            max_entries=NEAR_DUPLICATE_WINDOW,
+            ttl=NEAR_DUPLICATE_TTL,
+        )
+    return st.session_state.near_duplicate_index
+
+def find_near_duplicate(scope, prepared_file):
+    """
+    Result remembered (remember_scan) for the same picture in this session
+    and scope, or None. Candidates found by hash must pass same_picture.
+    """
+    image_hash = perceptual_hash(prepared_file)
+    if image_hash is None:
+        return None
+    data = bytes(prepared_file.getbuffer())
+    match = get_near_duplicate_index().find(
+        scope, image_hash, confirm=lambda seen: same_picture(seen["image"], data)
+    )
+    return match["result"] if match else None
+
+def remember_scan(scope, prepared_file, result):
+    """Remembers a scan result for find_near_duplicate (images Pillow cannot read are skipped)."""
+    image_hash = perceptual_hash(prepared_file)
+    if image_hash is not None:
+        get_near_duplicate_index().add(
+            scope, image_hash, {"image": bytes(prepared_file.getbuffer()), "result": result}
+        )
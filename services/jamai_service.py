@@ -2,8 +2,34 @@ import streamlit as st
 import tempfile
 import os
 import re
-import json
-from jamaibase import JamAI, types as p
+import io
+import hashlib
+import threading
+import time
+import uuid
+import asyncio
+import concurrent.futures
+import httpx
+from collections import OrderedDict
+from utils.lazy_import import LazyModule
+from services.cache import PersistentCache, SimilarityCache
+from services.text_utils import normalize_drink_name
+from services.image_prep import prepare_image, split_menu_tiles
+from services.resilience import (
+    CircuitBreaker, CircuitOpenError, BudgetExceededError,
+    call_with_retry, call_with_retry_async, is_outage, transport_error,
+)
+from services.estimator import estimate_drink
+from utils.grading import nutrigrade, nutrigrades_per_serving
+from services.drink_index import load_drink_index
+from services.menu_parser import MenuStreamParser, parse_menu_output
+
+# jamaibase takes ~1.5 s to import; it is loaded on the first real JamAI call instead
+p = LazyModule("jamaibase.types")
+_jamai_client = LazyModule("jamaibase.client")         # JamAI, _GenTableClientAsync
+_jamai_loop = LazyModule("jamaibase.utils.background_loop")
+_jamai_io = LazyModule("jamaibase.utils.io")
+_jamai_errors = LazyModule("jamaibase.utils.exceptions")
 
 # ==========================================
 # 🔧 CONFIGURATION (MATCH THIS TO YOUR JAMAI TABLES)
@@ -75,63 +101,728 @@ MANUAL_COLS = {
     "output_alternative": "alternative"
 }
 
+# 7. Connection Pool Config
+HEALTH_CHECK_INTERVAL = 60  # Seconds between health probes of the shared client
+
+# 8. Upload Cache Config (image digest -> JamAI file URI)
+UPLOAD_CACHE_SIZE = 500
+UPLOAD_CACHE_TTL = 24 * 60 * 60  # Seconds
+
+# 9. Result Cache Config (image digest + mode + multiplier + language -> analysis)
+RESULT_CACHE_SIZE = 2000
+
+# 10. Manual Lookup Cache Config (normalized drink name + options -> analysis)
+MANUAL_CACHE_SIZE = 5000
+MANUAL_CACHE_TTL = 7 * 24 * 60 * 60  # Seconds; re-ask the LLM weekly so prompt fixes roll out
+
+# 11. Output Projections (the outputs each analyzer actually reads)
+IMAGE_OUTPUTS = tuple(k for k in IMAGE_COLS if k.startswith("output_"))
+MENU_OUTPUTS = ("output_data",)
+DRINK_OUTPUTS = tuple(k for k in DRINK_COLS if k.startswith("output_"))
+MANUAL_OUTPUTS = tuple(k for k in MANUAL_COLS if k.startswith("output_"))
+
+# 12. Batch Config
+MAX_BATCH_ROWS = 100  # JamAI accepts at most 100 rows per add-rows request
+
+# 13. Resilience Config
+TIMEOUT_BUDGETS = {  # Seconds per call, retries included
+    CHAT_TABLE_ID: 60,
+    CHAT2_TABLE_ID: 60,
+    IMAGE_TABLE_ID: 90,
+    MENU_TABLE_ID: 120,
+    DRINK_TABLE_ID: 60,
+    MANUAL_TABLE_ID: 45,
+}
+DEFAULT_TIMEOUT_BUDGET = 60
+UPLOAD_TIMEOUT_BUDGET = 60
+RETRY_POLICY = {"attempts": 3, "base_delay": 0.5, "max_delay": 8.0}  # Jittered exponential backoff
+BREAKER_FAILURE_THRESHOLD = 5  # Outage errors in a row before failing fast
+BREAKER_RESET_TIMEOUT = 30     # Seconds before one trial call is let through
+
+# 14. Menu Tile Config
+MENU_TILE_CONCURRENCY = 4  # Tiles of one menu analyzed at the same time
+
+# 15. Chat Answer Cache (similar questions to the same persona share one answer)
+CHAT_CACHE_MIN_SCORE = 0.93      # Trigram similarity two questions need to count as the same
+CHAT_CACHE_SIZE = 500            # Answers kept per persona table + language
+CHAT_CACHE_TTL = 24 * 60 * 60    # Seconds
+
+# 16. Ask AI Prefetch (answers generated while a scan result is on screen)
+PREFETCH_CONCURRENCY = 4   # Speculative chat calls running at once, server-wide
+PREFETCH_SETTLE = 3        # Seconds a prompt must stay on screen before its calls are sent
+PREFETCH_MAX_ENTRIES = 50  # Sessions with a prefetch (one each); the oldest is cancelled past this
+PREFETCH_TTL = 10 * 60     # Seconds an unclaimed answer is kept
+
+# 17. Background Scan Jobs
+SCAN_CONCURRENCY = 8       # Scans running at once, server-wide (the rest wait for a slot)
+SCAN_ABANDON_AFTER = 30    # Seconds without a poll (page left, tab closed) before a scan cancels itself
+SCAN_WATCH_INTERVAL = 1    # Seconds between abandonment checks
+
 api_key = st.secrets.get("JAMAI_API_KEY")
 # ==========================================
 # 🔌 CLIENT INITIALIZATION
 # ==========================================
+_health_lock = threading.Lock()
+_last_health_check = [0.0]  # Time of the last probe (shared by all sessions)
+
+def _client_is_healthy(client):
+    """
+    Validator for the pooled client.
+    Probes JamAI at most once per HEALTH_CHECK_INTERVAL. A closed client, or
+    one whose connection fails, is dropped so Streamlit builds a fresh one.
+    """
+    if client.http_client.is_closed:
+        return False
+
+    # Never block JamAI's own event loop with a sync probe; sync callers re-check
+    if threading.current_thread() is _jamai_loop.LOOP.thread:
+        return True
+
+    now = time.monotonic()
+    with _health_lock:
+        if now - _last_health_check[0] < HEALTH_CHECK_INTERVAL:
+            return True
+        # Claim the slot so concurrent sessions don't all probe at once
+        _last_health_check[0] = now
+
+    try:
+        client.health()
+    except Exception:
+        # Any failed probe (jamaibase wraps network errors) drops the client
+        return False
+    return True
+
+@st.cache_resource(show_spinner=False, validate=_client_is_healthy)
+def _get_pooled_client(token, project_id):
+    """
+    One long-lived JamAI client per server process, shared by every session.
+    Its httpx connection pool keeps connections alive between calls, so scans
+    and chat turns reuse the same TLS connections.
+    """
+    return _jamai_client.JamAI(token=token, project_id=project_id)
+
 def init_client():
-    """Initializes the JamAI client securely."""
+    """Returns the shared JamAI client (created on first use)."""
     api_key = st.secrets.get("JAMAI_API_KEY")
     if not api_key:
         st.error("❌ JAMAI_API_KEY missing from secrets.toml")
         return None
-    return JamAI(token=api_key, project_id=PROJECT_ID)
+    return _get_pooled_client(api_key, PROJECT_ID)
+
+def _with_client(action):
+    """
+    Runs action(client) on the pooled client.
+    If the pooled connection was dropped underneath us, the client is rebuilt
+    and the action is retried once.
+    """
+    client = _get_pooled_client(api_key, PROJECT_ID)
+    try:
+        return action(client)
+    except Exception as e:
+        if transport_error(e) is None:
+            raise
+        _get_pooled_client.clear()
+        return action(_get_pooled_client(api_key, PROJECT_ID))
+
+# One breaker per server process: while JamAI is down, every session fails fast
+_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+def jamai_is_degraded():
+    """True while the circuit breaker is open (JamAI calls fail fast)."""
+    return _breaker.is_open
+
+async def _with_client_async(action):
+    """Async twin of _with_client: awaits action(client), rebuilding the client once on a dropped connection."""
+    client = _get_pooled_client(api_key, PROJECT_ID)
+    try:
+        return await action(client)
+    except Exception as e:
+        if transport_error(e) is None:
+            raise
+        _get_pooled_client.clear()
+        return await action(_get_pooled_client(api_key, PROJECT_ID))
+
+def _add_rows(table_type, request):
+    """
+    Adds rows to a JamAI table using the pooled client, with retries,
+    the table's time budget and the circuit breaker.
+    """
+    return call_with_retry(
+        lambda timeout: _with_client(lambda jam: jam.table.add_table_rows(table_type, request, timeout=timeout)),
+        TIMEOUT_BUDGETS.get(request.table_id, DEFAULT_TIMEOUT_BUDGET),
+        _breaker,
+        **RETRY_POLICY
+    )
+
+async def add_rows_async(table_type, request):
+    """
+    Async add-rows on the pooled client. Like every *_async function here it
+    must run on JamAI's background event loop (see run_in_background), which
+    owns the shared connection pool.
+    """
+    return await call_with_retry_async(
+        lambda timeout: _with_client_async(
+            lambda jam: _jamai_client._GenTableClientAsync.add_table_rows(jam.table, table_type, request, timeout=timeout)
+        ),
+        TIMEOUT_BUDGETS.get(request.table_id, DEFAULT_TIMEOUT_BUDGET),
+        _breaker,
+        **RETRY_POLICY
+    )
+
+def run_in_background(coro):
+    """
+    Schedules a coroutine on JamAI's background event loop and returns a
+    concurrent.futures.Future right away. Calls from every session overlap
+    on that one loop thread instead of blocking a script thread each.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _jamai_loop.LOOP.loop)
+
+def gather_in_background(*coros):
+    """
+    Runs several coroutines concurrently on the JamAI loop.
+    Returns one Future whose result lists each outcome (or exception) in order.
+    """
+    async def gather():
+        return await asyncio.gather(*coros, return_exceptions=True)
+    return run_in_background(gather())
+
+# ==========================================
+# 🧵 BACKGROUND SCAN JOBS
+# ==========================================
+class BackgroundJob:
+    """
+    Handle to one scan running on the JamAI loop (see submit_job), kept in
+    session_state. The page showing it calls touch() on every poll; a job
+    nobody has polled for SCAN_ABANDON_AFTER seconds cancels itself, and
+    cancel() stops it at once (upload and generation included).
+    """
+
+    def __init__(self):
+        self.future = None  # concurrent.futures.Future of the job's coroutine
+        self.last_seen = time.monotonic()
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def cancelled(self):
+        return self.future is not None and self.future.cancelled()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+
+    def _finish_now(self, value=None):
+        """Marks the job done without running anything (e.g. answered from a cache)."""
+        self.future = concurrent.futures.Future()
+        self.future.set_result(value)
+
+_scan_slots = None  # asyncio.Semaphore(SCAN_CONCURRENCY), created on the JamAI loop
+
+async def _run_job(job, coro):
+    """Runs coro once a slot is free and cancels it if the job is abandoned."""
+    global _scan_slots
+    if _scan_slots is None:
+        _scan_slots = asyncio.Semaphore(SCAN_CONCURRENCY)
+
+    task = None
+    try:
+        async with _scan_slots:
+            task = asyncio.ensure_future(coro)
+            while not task.done():
+                await asyncio.wait({task}, timeout=SCAN_WATCH_INTERVAL)
+                if not task.done() and time.monotonic() - job.last_seen > SCAN_ABANDON_AFTER:
+                    task.cancel()
+            return task.result()
+    finally:
+        # Cancelled while queued or running: never leave the work behind
+        if task is None:
+            coro.close()
+        elif not task.done():
+            task.cancel()
+
+def submit_job(job, coro):
+    """Starts a BackgroundJob's coroutine on the JamAI loop and returns the job."""
+    _get_pooled_client(api_key, PROJECT_ID)  # Health-check here; the loop thread skips it
+    job.touch()
+    job.future = run_in_background(_run_job(job, coro))
+    return job
+
+class ScanJob(BackgroundJob):
+    """A label or drink analysis; result() is the UI result dict once done."""
+
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+
+    @property
+    def error(self):
+        if not self.done or self.cancelled:
+            return None
+        return self.future.exception()
+
+    def result(self):
+        """The analysis, or None while running / after a failure or cancel."""
+        if not self.done or self.cancelled or self.error is not None:
+            return None
+        return self.future.result()
+
+    def show_error(self):
+        if self.error is not None:
+            _report_error(self.label, self.error)
+
+def wait_for_scan(job):
+    """
+    Blocks until a ScanJob is done and returns its result, or None (reporting
+    the error) on failure. Keeps the job polled so it is not taken as abandoned.
+    """
+    if job is None:
+        return None
+    while not job.done:
+        job.touch()
+        concurrent.futures.wait([job.future], timeout=SCAN_WATCH_INTERVAL)
+    result = job.result()
+    if result is None:
+        job.show_error()
+    return result
+
+async def _analyze_image_async(uploaded_file, digest, cache_key, table_id, row, parse_row):
+    """
+    Upload + add one row + parse, for a ScanJob. `row` maps the uploaded
+    image's URI to the row data. Raises on failure instead of touching st.*.
+    """
+    image_uri = await upload_image_async(uploaded_file, digest)
+    completion = await add_rows_async(
+        "action",
+        p.MultiRowAddRequest(table_id=table_id, data=[row(image_uri)], stream=False)
+    )
+    if not completion.rows:
+        raise ValueError(f"JamAI returned no rows for '{table_id}'")
+
+    result = parse_row(completion.rows[0].columns)
+    _result_cache.set(cache_key, result)
+    return result
+
+# ==========================================
+# 📤 IN-MEMORY FILE UPLOAD
+# ==========================================
+class _BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over an existing buffer.
+    httpx reads it in chunks, so the image is never copied or written to disk.
+    """
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        # Release the export so the source buffer can be resized/freed again
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+_upload_cache = PersistentCache("uploads", max_entries=UPLOAD_CACHE_SIZE, ttl=UPLOAD_CACHE_TTL)
+
+def image_digest(data):
+    """Content hash of an image buffer, used as the upload and result cache key."""
+    return hashlib.sha256(data).hexdigest()
+
+async def upload_bytes_async(data, filename, digest=None):
+    """
+    Uploads an in-memory file to JamAI storage and returns its URI.
+    Mirrors JamAI's upload_file(), which only accepts a path on disk, but
+    streams the multipart body straight from `data` instead.
+    Identical content uploaded before is served from the upload cache.
+    """
+    cache_key = f"{PROJECT_ID}:{digest or image_digest(data)}"
+    cached_uri = _upload_cache.get(cache_key)
+    if cached_uri:
+        return cached_uri
+
+    async def upload(jam, timeout):
+        with _BufferReader(data) as reader:
+            response = await jam.file._post(
+                "/v2/files/upload",
+                body=None,
+                response_model=p.FileUploadResponse,
+                files={"file": (filename, reader, _jamai_io.guess_mime(filename))},
+                timeout=timeout,
+            )
+        return response.uri
+
+    uri = await call_with_retry_async(
+        lambda timeout: _with_client_async(lambda jam: upload(jam, timeout)),
+        UPLOAD_TIMEOUT_BUDGET,
+        _breaker,
+        **RETRY_POLICY
+    )
+    _upload_cache.set(cache_key, uri)
+    return uri
+
+def _upload_bytes(data, filename, digest=None):
+    """Sync wrapper of upload_bytes_async (blocks until the upload is done)."""
+    _get_pooled_client(api_key, PROJECT_ID)  # Health-check here; the loop thread skips it
+    return _jamai_loop.LOOP.run(upload_bytes_async(data, filename, digest))
+
+# ==========================================
+# 🗃️ RESULT CACHE
+# ==========================================
+_result_cache = PersistentCache("results", max_entries=RESULT_CACHE_SIZE)
+
+def _result_key(table_id, digest, multiplier=1.0, language=None):
+    """Cache key for one analysis: same image, same mode, same options -> same result."""
+    return f"{PROJECT_ID}:{table_id}:{digest}:{float(multiplier):g}:{language}"
+
+_manual_cache = PersistentCache("manual_lookups", max_entries=MANUAL_CACHE_SIZE, ttl=MANUAL_CACHE_TTL)
+
+def _manual_prefix(text):
+    """Key prefix of every cached answer for one typed drink (all multipliers and languages)."""
+    return f"{PROJECT_ID}:{MANUAL_TABLE_ID}:{normalize_drink_name(text)}:"
+
+def _manual_key(text, multiplier=1.0, language=None):
+    """Cache key for a typed drink: "Iced Tea-C" and "teh c ais" share one entry."""
+    return f"{_manual_prefix(text)}{float(multiplier):g}:{language}"
+
+_chat_cache = SimilarityCache("chat_answers", min_score=CHAT_CACHE_MIN_SCORE, max_entries=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL)
+
+def _chat_cacheable(user_text, use_cache):
+    """
+    Only general questions are shared: prompts with numbers (grams, grades of
+    a scan, the user's own intake) are about one person and always go to JamAI.
+    """
+    return use_cache and not re.search(r"\d", str(user_text))
+
+def get_cache_stats():
+    """Hit/miss counters and hit rate of the shared caches (since this server process started)."""
+    return {
+        cache.name: {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_rate": cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0,
+            "entries": len(cache),
+        }
+        for cache in (_upload_cache, _result_cache, _manual_cache, _chat_cache)
+    }
+
+def purge_manual_cache(drink_name=None):
+    """
+    Admin purge for manual lookups. Removes every cached answer for one drink
+    (all multipliers and languages), or the whole cache when no name is given.
+    Returns the number of entries removed.
+    """
+    if drink_name is None:
+        return _manual_cache.clear()
+    return _manual_cache.delete_prefix(_manual_prefix(drink_name))
+
+def _upload_image(uploaded_file, digest=None):
+    """Uploads a Streamlit UploadedFile (camera or file uploader) without a temp file."""
+    return _upload_bytes(uploaded_file.getbuffer(), os.path.basename(uploaded_file.name), digest)
+
+async def upload_image_async(uploaded_file, digest=None):
+    """Async _upload_image (run on the JamAI loop, see run_in_background)."""
+    return await upload_bytes_async(uploaded_file.getbuffer(), os.path.basename(uploaded_file.name), digest)
+
+# ==========================================
+# 🧩 RESPONSE DECODER
+# ==========================================
+def cell_text(cell, default=None):
+    """
+    Reads the text out of one JamAI cell, whatever shape it arrives in.
+    Empty cells return `default` when one is given.
+    """
+    if not cell and default is not None:
+        return default
+
+    # --- 1. HANDLE "WEIRD" CHAT OBJECT (The Fix) ---
+    # This handles: id='chatcmpl-...' choices=[...]
+    choices = getattr(cell, "choices", None)
+    if choices:
+        # Dig 3 levels deep to find the text
+        return choices[0].message.content
+
+    # --- 2. HANDLE STANDARD JAMAI VALUE ---
+    if hasattr(cell, "value"):
+        return cell.value
+
+    # --- 3. FALLBACK FOR DICTIONARIES ---
+    if isinstance(cell, dict) and "value" in cell:
+        return cell["value"]
+
+    # --- 4. LAST RESORT ---
+    return str(cell)
+
+def decode_row(row, col_map, keys, default="0"):
+    """
+    Decodes only the requested outputs of one row (column -> cell).
+    `keys` are col_map keys, e.g. ("output_name", "output_grade"); returns {key: text}.
+    """
+    return {key: cell_text(row.get(col_map[key]), default) for key in keys}
+
+def _report_error(label, error):
+    """Shows an analyzer failure. Outages get a calm "try again" instead of a raw exception."""
+    if isinstance(error, CircuitOpenError):
+        st.warning(f"⏳ JamAI is busy right now. Please try again in {error.retry_in:.0f}s.")
+    elif isinstance(error, BudgetExceededError):
+        st.warning(f"⏳ {label} took too long ({error}). Please try again.")
+    else:
+        st.error(f"❌ {label} Error: {error}")
 
 # ==========================================
 # 💬 LOGIC 1: CHATBOT (FINAL FIX)
 # ==========================================
-def chat_with_jamai(user_text, table_id="chat", language="English"):
+def _chat_request(user_text, table_id, language, stream):
+    """Builds the add-row request for one chat turn."""
+    return p.MultiRowAddRequest(
+        table_id=table_id,
+        data=[{
+            CHAT_COLS["input"]: user_text,
+            CHAT_COLS["language"]: language
+        }],
+        stream=stream
+    )
+
+def chat_with_jamai(user_text, table_id="chat", language="English", use_cache=True):
+    """
+    Asks a persona table. Questions similar to one answered before (same
+    persona and language) are answered from the chat cache; pass
+    use_cache=False for prompts built from the user's own data.
+    """
+    cacheable = _chat_cacheable(user_text, use_cache)
+    if cacheable:
+        cached = _chat_cache.get((table_id, language), user_text)
+        if cached:
+            return cached
+
     try:
         client = init_client()
         if not client: return "Error: Connection Failed"
 
-        response = client.table.add_table_rows(
-            "chat", 
-            p.MultiRowAddRequest(
-                table_id=table_id,
-                data=[{
-                    CHAT_COLS["input"]: user_text,
-                    CHAT_COLS["language"]: language
-                }],
-                stream=False
-            )
-        )
+        response = _add_rows("chat", _chat_request(user_text, table_id, language, stream=False))
 
         if response and response.rows:
-            ai_cell = response.rows[0].columns.get(CHAT_COLS["output"])
+            answer = cell_text(response.rows[0].columns.get(CHAT_COLS["output"]))
+            if cacheable and answer:
+                _chat_cache.set((table_id, language), user_text, answer)
+            return answer
+
+        return "⚠️ No response from AI."
+
+    except Exception as e:
+        return f"❌ Chat Error: {str(e)}"
+
+def stream_chat_with_jamai(user_text, table_id="chat", language="English", use_cache=True):
+    """
+    Streaming variant of chat_with_jamai: yields the AI reply piece by piece
+    as JamAI generates it (for st.write_stream). A cached answer is yielded whole.
+    """
+    cacheable = _chat_cacheable(user_text, use_cache)
+    if cacheable:
+        cached = _chat_cache.get((table_id, language), user_text)
+        if cached:
+            yield cached
+            return
+
+    try:
+        client = init_client()
+        if not client:
+            yield "Error: Connection Failed"
+            return
+
+        chunks = _add_rows("chat", _chat_request(user_text, table_id, language, stream=True))
+
+        parts = []
+        for chunk in chunks:
+            # 1. Skip references and other output columns
+            if getattr(chunk, "output_column_name", None) != CHAT_COLS["output"]:
+                continue
 
-            # --- 1. HANDLE "WEIRD" CHAT OBJECT (The Fix) ---
-            # This handles: id='chatcmpl-...' choices=[...]
-            if hasattr(ai_cell, "choices") and len(ai_cell.choices) > 0:
-                # Dig 3 levels deep to find the text
-                return ai_cell.choices[0].message.content
+            # 2. Streamed token (delta), else fall back to the full-cell shapes
+            try:
+                text = chunk.text
+            except (AttributeError, IndexError):
+                text = cell_text(chunk)
+
+            if text:
+                parts.append(text)
+                yield text
 
-            # --- 2. HANDLE STANDARD JAMAI VALUE ---
-            if hasattr(ai_cell, "value"):
-                return ai_cell.value
+        # 3. Remember the finished answer for similar questions
+        if not parts:
+            yield "⚠️ No response from AI."
+        elif cacheable:
+            _chat_cache.set((table_id, language), user_text, "".join(parts))
 
-            # --- 3. FALLBACK FOR DICTIONARIES ---
-            if isinstance(ai_cell, dict) and "value" in ai_cell:
-                return ai_cell["value"]
+    except Exception as e:
+        yield f"❌ Chat Error: {str(e)}"
 
-            # --- 4. LAST RESORT ---
-            return str(ai_cell)
+async def chat_with_jamai_async(user_text, table_id="chat", language="English", use_cache=True):
+    """
+    Async chat_with_jamai (run on the JamAI loop, see run_in_background).
+    Never touches st.*, so it is safe to await outside the script thread.
+    """
+    cacheable = _chat_cacheable(user_text, use_cache)
+    if cacheable:
+        cached = _chat_cache.get((table_id, language), user_text)
+        if cached:
+            return cached
+
+    try:
+        if not api_key: return "Error: Connection Failed"
+
+        response = await add_rows_async("chat", _chat_request(user_text, table_id, language, stream=False))
+
+        if response and response.rows:
+            answer = cell_text(response.rows[0].columns.get(CHAT_COLS["output"]))
+            if cacheable and answer:
+                _chat_cache.set((table_id, language), user_text, answer)
+            return answer
 
         return "⚠️ No response from AI."
 
     except Exception as e:
         return f"❌ Chat Error: {str(e)}"
 
+# ==========================================
+# 🔮 ASK AI PREFETCH
+# ==========================================
+_prefetch_lock = threading.Lock()
+_prefetch_slots = threading.BoundedSemaphore(PREFETCH_CONCURRENCY)
+_prefetched = OrderedDict()  # session id -> _Prefetch, oldest first
+
+class _Prefetch:
+    """One session's speculative Ask AI answers: one Future per persona."""
+
+    def __init__(self, key, result_id):
+        self.key = key                    # (language, prompt)
+        self.result_id = result_id        # Scan result the prompt was built from
+        self.created = time.monotonic()
+        self.started = threading.Event()  # Set once the calls were sent (i.e. paid for)
+        self.futures = {}                 # table_id -> Future
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+def _session_id():
+    """This browser session's id (the one the Chat page keys its transcript by)."""
+    return st.session_state.setdefault("chat_session_id", uuid.uuid4().hex)
+
+def persona_prompt(user_text, table_id, language):
+    """The prompt as sent to a persona: Mak Cik Manis needs telling to answer in English."""
+    if language == "English" and table_id == CHAT2_TABLE_ID:
+        return f"{user_text} (Please answer in English)"
+    return user_text
+
+async def _prefetch_answer(user_text, table_id, language, started):
+    """
+    chat_with_jamai_async for prefetching: waits PREFETCH_SETTLE seconds first
+    (a cancel meanwhile costs nothing), then raises instead of returning an
+    error text. Gives up when PREFETCH_CONCURRENCY calls are already running.
+    """
+    await asyncio.sleep(PREFETCH_SETTLE)
+    if not _prefetch_slots.acquire(blocking=False):
+        raise RuntimeError("Too many prefetches running")
+    started.set()
+    try:
+        request = _chat_request(persona_prompt(user_text, table_id, language), table_id, language, stream=False)
+        response = await add_rows_async("chat", request)
+    finally:
+        _prefetch_slots.release()
+    answer = cell_text(response.rows[0].columns.get(CHAT_COLS["output"])) if response and response.rows else None
+    if not answer:
+        raise ValueError("No response from AI")
+    return answer
+
+def prefetch_chat_answers(user_text, language="English", result_id=None):
+    """
+    Starts answering an Ask AI prompt for both personas in the background, so
+    the Chat page can show the answer at once. One prefetch per session: a new
+    prompt replaces the previous one for free until its calls are sent
+    (PREFETCH_SETTLE), and once they are, other prompts for the same
+    result_id (e.g. the sweetness slider moved) are not prefetched again.
+    Skipped while JamAI is degraded.
+    """
+    if not api_key or not PROJECT_ID or jamai_is_degraded():
+        return
+
+    session = _session_id()
+    key = (language, user_text)
+    now = time.monotonic()
+    with _prefetch_lock:
+        # 1. Drop anything unclaimed for too long
+        for stale in [s for s, prefetch in _prefetched.items() if now - prefetch.created > PREFETCH_TTL]:
+            _prefetched.pop(stale).cancel()
+
+        # 2. Keep this session's current prefetch if it is the same prompt or already paid for
+        current = _prefetched.get(session)
+        if current is not None:
+            if current.key == key:
+                return
+            if result_id is not None and current.result_id == result_id and current.started.is_set():
+                return
+            _prefetched.pop(session).cancel()
+
+        # 3. One background call per persona (sent after the settle delay)
+        _get_pooled_client(api_key, PROJECT_ID)  # Health-check here; the loop thread skips it
+        prefetch = _Prefetch(key, result_id)
+        for table_id in (CHAT_TABLE_ID, CHAT2_TABLE_ID):
+            prefetch.futures[table_id] = run_in_background(
+                _prefetch_answer(user_text, table_id, language, prefetch.started)
+            )
+        _prefetched[session] = prefetch
+        while len(_prefetched) > PREFETCH_MAX_ENTRIES:
+            _prefetched.popitem(last=False)[1].cancel()
+
+def take_prefetched_chat(user_text, table_id="chat", language="English"):
+    """
+    Claims this session's prefetched answer for one prompt and persona: a
+    Future that may still be running (its result() is the answer). The other
+    persona's call is cancelled. Returns None if nothing was prefetched or
+    the calls were not sent yet (asking now is quicker than waiting).
+    """
+    session = _session_id()
+    with _prefetch_lock:
+        prefetch = _prefetched.get(session)
+        if prefetch is None or prefetch.key != (language, user_text):
+            return None
+        del _prefetched[session]
+
+    future = prefetch.futures.pop(table_id, None)
+    prefetch.cancel()
+    if future is None or future.cancelled() or not prefetch.started.is_set():
+        if future is not None:
+            future.cancel()
+        return None
+    return future
+
 # ==========================================
 # 📸 LOGIC 2: IMAGE ANALYZER
 # ==========================================
@@ -151,99 +842,79 @@ def clean_number(value):
         return float(match.group(1))
     return 0.0
 
+def _grade_result(result):
+    """
+    Sets a single-drink result's Nutri-Grade from its own numbers (utils.grading),
+    never the LLM's: per 100 ml, or per serving when a label only lists that.
+    Also applied to cached results, which may predate local grading.
+    """
+    if result.get("sugar_100g") or result.get("fat_100g"):
+        result["grade"] = nutrigrade(result.get("sugar_100g", 0), result.get("fat_100g", 0))
+    else:
+        result["grade"] = str(nutrigrades_per_serving([result.get("sugar_g", 0)], [result.get("fat_g", 0)])[0])
+    return result
+
+def _parse_image_row(row):
+    """Turns one 'scanner' table row (column -> cell) into the UI result dict."""
+    v = decode_row(row, IMAGE_COLS, IMAGE_OUTPUTS)
+    raw_name    = v["output_name"]
+    raw_sugar   = v["output_sugar"]
+    raw_fat     = v["output_fat"]
+    raw_sugar_100 = v["output_sugar_100"]
+    raw_fat_100   = v["output_fat_100"]
+    raw_comment = v["output_comment"]
+    raw_alt     = v["output_alternative"]
+    raw_is_bev  = v["output_isBeverage"]
+
+    # Logic: Check if it's a beverage
+    if isinstance(raw_is_bev, bool):
+        is_valid_beverage = raw_is_bev
+    else:
+        is_valid_beverage = str(raw_is_bev).strip().lower() == 'true'
+
+    return _grade_result({
+        "name": str(raw_name).strip(),
+        "sugar_g": clean_number(raw_sugar),
+        "fat_g": clean_number(raw_fat),
+        "sugar_100g": clean_number(raw_sugar_100),
+        "fat_100g": clean_number(raw_fat_100),
+        "comment": str(raw_comment).strip(),
+        "alternative": str(raw_alt).strip(),
+        "is_beverage": is_valid_beverage
+    })
+
 def analyze_image_with_jamai(uploaded_file, language="English"):
     """
     Sends image to JamAI Base table and returns formatted dict for UI.
+    Blocking form of start_image_scan (same cache, upload and parsing).
+    """
+    return wait_for_scan(start_image_scan(uploaded_file, language))
+
+def start_image_scan(uploaded_file, language="English"):
+    """
+    Sends image to JamAI Base table in the background: returns a ScanJob right
+    away (already done for a cached image), or None if the API is not configured.
     """
     # 1. Validation Check
     if not api_key or not PROJECT_ID:
         st.error("❌ Missing API Configuration. Please check your .streamlit/secrets.toml file.")
         return None
 
-    # 2. Initialize JamAI
-    jam = JamAI(token=api_key, project_id=PROJECT_ID)
-
-    # 3. Handle File Upload
-    temp_filename = f"temp_{uploaded_file.name}"
-    with open(temp_filename, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    # 2. Prepare Image (orient, strip metadata, downscale, re-encode)
+    uploaded_file = prepare_image(uploaded_file, "label")
 
-    try:
-        # 4. Upload File to JamAI Storage
-        upload_response = jam.file.upload_file(temp_filename)
-        image_uri = upload_response.uri
+    # 3. Check Result Cache
+    job = ScanJob("Image Analysis")
+    digest = image_digest(uploaded_file.getbuffer())
+    cache_key = _result_key(IMAGE_TABLE_ID, digest, language=language)
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        job._finish_now(_grade_result(cached))
+        return job
 
-        # 5. Add Row to JamAI Table
-        # Using add_table_rows with the correct protocol
-        completion = jam.table.add_table_rows(
-            "action",
-            p.MultiRowAddRequest(
-                table_id=IMAGE_TABLE_ID,
-                data=[{
-                    IMAGE_COLS["image_input"]: image_uri,
-                    IMAGE_COLS["language"]: language
-                }],
-                stream=False
-            )
-        )
-
-        # 6. Clean up temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
-
-        # 7. Extract Data from Response
-        if completion.rows:
-            row = completion.rows[0].columns
-            
-            # Helper to safely extract content from mixed cell types
-            def get_val(col_name):
-                cell = row.get(col_name)
-                if not cell: return "0"
-                # Check for ChatCompletion object
-                if hasattr(cell, "choices") and len(cell.choices) > 0:
-                    return cell.choices[0].message.content
-                # Check for standard value attribute
-                if hasattr(cell, "value"):
-                    return cell.value
-                # Fallback
-                return str(cell)
-
-            raw_name    = get_val(IMAGE_COLS["output_name"])
-            raw_sugar   = get_val(IMAGE_COLS["output_sugar"])
-            raw_fat     = get_val(IMAGE_COLS["output_fat"])
-            raw_sugar_100 = get_val(IMAGE_COLS["output_sugar_100"])
-            raw_fat_100   = get_val(IMAGE_COLS["output_fat_100"])
-            raw_grade   = get_val(IMAGE_COLS["output_grade"])
-            raw_comment = get_val(IMAGE_COLS["output_comment"])
-            raw_alt     = get_val(IMAGE_COLS["output_alternative"])
-            raw_is_bev  = get_val(IMAGE_COLS["output_isBeverage"]) 
-
-            # Logic: Check if it's a beverage
-            if isinstance(raw_is_bev, bool):
-                is_valid_beverage = raw_is_bev
-            else:
-                is_valid_beverage = str(raw_is_bev).strip().lower() == 'true'
-
-            return {
-                "name": str(raw_name).strip(),
-                "grade": str(raw_grade).strip().upper(),
-                "sugar_g": clean_number(raw_sugar),
-                "fat_g": clean_number(raw_fat),
-                "sugar_100g": clean_number(raw_sugar_100),
-                "fat_100g": clean_number(raw_fat_100),
-                "comment": str(raw_comment).strip(),
-                "alternative": str(raw_alt).strip(),
-                "is_beverage": is_valid_beverage
-            }
-        else:
-            st.error("❌ JamAI returned no rows. Check if your table has Flow enabled.")
-            return None
-            
-    except Exception as e:
-        st.error(f"❌ Image Analysis Error: {e}")
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
-        return None
+    # 4. Upload + Add Row in the Background
+    row = lambda image_uri: {IMAGE_COLS["image_input"]: image_uri, IMAGE_COLS["language"]: language}
+    return submit_job(job, _analyze_image_async(uploaded_file, digest, cache_key, IMAGE_TABLE_ID, row, _parse_image_row))
 
 # ==========================================
 # 📜 LOGIC 3: MENU ANALYZER
@@ -251,28 +922,31 @@ def analyze_image_with_jamai(uploaded_file, language="English"):
 # Added menu analysis function
 def analyze_menu_with_jamai(uploaded_file):
     """
-    Sends menu image to JamAI 'menu' table and returns parsed JSON data.
+    Sends menu image to JamAI 'menu' table and returns its drinks as a list of
+    normalized items (name, sugar_g, fat_g, sugar_100g, fat_100g).
+    Repeat scans of the same image are answered from the result cache.
     """
     # 1. Validation Check
     if not api_key or not PROJECT_ID:
         st.error("❌ Missing API Configuration. Please check your .streamlit/secrets.toml file.")
         return None
 
-    # 2. Initialize JamAI
-    jam = JamAI(token=api_key, project_id=PROJECT_ID)
+    # 2. Prepare Image (orient, strip metadata, downscale, re-encode)
+    uploaded_file = prepare_image(uploaded_file, "menu")
 
-    # 3. Handle File Upload
-    temp_filename = f"temp_menu_{uploaded_file.name}"
-    with open(temp_filename, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    # 3. Check Result Cache (entries from before the item list format are re-scanned)
+    digest = image_digest(uploaded_file.getbuffer())
+    cache_key = _result_key(MENU_TABLE_ID, digest)
+    cached = _result_cache.get(cache_key)
+    if isinstance(cached, list):
+        return cached
 
     try:
-        # 4. Upload File to JamAI Storage
-        upload_response = jam.file.upload_file(temp_filename)
-        image_uri = upload_response.uri
+        # 4. Upload Image to JamAI Storage (streamed from memory)
+        image_uri = _upload_image(uploaded_file, digest)
 
         # 5. Add Row to JamAI Table
-        completion = jam.table.add_table_rows(
+        completion = _add_rows(
             "action",
             p.MultiRowAddRequest(
                 table_id=MENU_TABLE_ID,
@@ -283,165 +957,310 @@ def analyze_menu_with_jamai(uploaded_file):
             )
         )
 
-        # 6. Clean up temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
-
-        # 7. Extract Data from Response
+        # 6. Extract Data from Response (every complete item, even from broken JSON)
         if completion.rows:
-            row = completion.rows[0].columns
-            
-            # Helper to safely extract content
-            def get_val(col_name):
-                cell = row.get(col_name)
-                if not cell: return "{}"
-                if hasattr(cell, "choices") and len(cell.choices) > 0:
-                    return cell.choices[0].message.content
-                if hasattr(cell, "value"):
-                    return cell.value
-                return str(cell)
-
-            raw_json = get_val(MENU_COLS["output_data"])
-            
-            # Clean up JSON string if it contains markdown code blocks
-            raw_json = str(raw_json).strip()
-            if raw_json.startswith("```json"):
-                raw_json = raw_json[7:]
-            if raw_json.startswith("```"):
-                raw_json = raw_json[3:]
-            if raw_json.endswith("```"):
-                raw_json = raw_json[:-3]
-            
-            try:
-                parsed_data = json.loads(raw_json)
-                return parsed_data
-            except json.JSONDecodeError:
-                st.error(f"❌ Failed to parse JSON from JamAI. Raw output: {raw_json[:100]}...")
+            raw_json = decode_row(completion.rows[0].columns, MENU_COLS, MENU_OUTPUTS, default="{}")["output_data"]
+            items, complete = parse_menu_output(raw_json)
+
+            if not items:
+                st.error(f"❌ Failed to parse JSON from JamAI. Raw output: {str(raw_json)[:100]}...")
                 return None
+            if complete:
+                _result_cache.set(cache_key, items)
+            else:
+                st.warning(f"⚠️ Part of the menu could not be read; showing the {len(items)} item(s) that were.")
+            return items
         else:
             st.error("❌ JamAI returned no rows for menu analysis.")
             return None
             
     except Exception as e:
-        st.error(f"❌ Menu Analysis Error: {e}")
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        _report_error("Menu Analysis", e)
+        return None
+
+class MenuScan(BackgroundJob):
+    """
+    A menu scan streaming on the JamAI loop. `items` grows (normalized, in
+    the order they are extracted) as each drink's JSON object completes; the
+    script thread only reads it, so the list can be re-rendered while the
+    scan is still running.
+    """
+
+    def __init__(self, items=None, done=False):
+        super().__init__()
+        self.items = []
+        self.complete = done  # True once every tile's output parsed cleanly
+        self.error = None
+        self._positions = {}  # normalized name -> position in items
+        for item in items or []:
+            self.add(item)
+        if done:
+            self._finish_now()
+
+    def add(self, item):
+        """Adds one item; a drink already seen (e.g. in an overlapping tile) is merged, not repeated."""
+        key = normalize_drink_name(item["name"]) if item["name"] != "Unknown Item" else ""
+        position = self._positions.get(key) if key else None
+        if position is None:
+            if key:
+                self._positions[key] = len(self.items)
+            self.items.append(item)
+            return
+
+        # Keep whichever reading has more of the nutrition values filled in
+        filled = lambda i: sum(1 for k in ("sugar_g", "fat_g", "sugar_100g", "fat_100g") if i[k])
+        if filled(item) > filled(self.items[position]):
+            self.items[position] = item
+
+    def snapshot(self):
+        return list(self.items)
+
+    def show_error(self):
+        if self.error is not None:
+            _report_error("Menu Analysis", self.error)
+
+async def _stream_menu_tile(scan, tile):
+    """
+    Uploads one menu tile, streams its 'menu' table output and adds every
+    item as its object closes. Returns True if the output parsed cleanly.
+    """
+    parser = MenuStreamParser()
+    image_uri = await upload_image_async(tile)
+    chunks = await add_rows_async(
+        "action",
+        p.MultiRowAddRequest(
+            table_id=MENU_TABLE_ID,
+            data=[{
+                MENU_COLS["image_input"]: image_uri
+            }],
+            stream=True
+        )
+    )
+
+    async for chunk in chunks:
+        # 1. Skip references and other output columns
+        if getattr(chunk, "output_column_name", None) != MENU_COLS["output_data"]:
+            continue
+
+        # 2. Streamed token (delta), else the full-cell shapes
+        try:
+            text = chunk.text
+        except (AttributeError, IndexError):
+            text = cell_text(chunk)
+
+        # 3. Publish every item whose object just closed
+        for item in parser.feed(text):
+            scan.add(item)
+
+    return parser.complete
+
+async def _stream_menu(scan, tiles, cache_key):
+    """Analyzes all tiles of one menu concurrently (MENU_TILE_CONCURRENCY at a time)."""
+    semaphore = asyncio.Semaphore(MENU_TILE_CONCURRENCY)
+
+    async def run_tile(tile):
+        async with semaphore:
+            return await _stream_menu_tile(scan, tile)
+
+    # 1. Stream every tile; one failing tile does not stop the others
+    outcomes = await asyncio.gather(*(run_tile(tile) for tile in tiles), return_exceptions=True)
+    errors = [o for o in outcomes if isinstance(o, Exception)]
+    if errors:
+        scan.error = errors[0]
+
+    # 2. Cache only a menu that was read completely
+    scan.complete = not errors and all(outcomes) and bool(scan.items)
+    if scan.complete:
+        _result_cache.set(cache_key, scan.snapshot())
+
+def start_menu_scan(uploaded_file):
+    """
+    Streaming analyze_menu_with_jamai: starts the scan on the JamAI loop and
+    returns a MenuScan right away (already done for a cached image).
+    Big menus are split into overlapping tiles that are analyzed in parallel;
+    drinks found in more than one tile are listed once.
+    Returns None if the API is not configured.
+    """
+    # 1. Validation Check
+    if not api_key or not PROJECT_ID:
+        st.error("❌ Missing API Configuration. Please check your .streamlit/secrets.toml file.")
         return None
 
+    # 2. Prepare Image (orient, strip metadata, downscale, re-encode)
+    uploaded_file = prepare_image(uploaded_file, "menu")
+
+    # 3. Check Result Cache
+    digest = image_digest(uploaded_file.getbuffer())
+    cache_key = _result_key(MENU_TABLE_ID, digest)
+    cached = _result_cache.get(cache_key)
+    if isinstance(cached, list):
+        return MenuScan(cached, done=True)
+
+    # 4. Split Big Menus into Overlapping Tiles
+    tiles = split_menu_tiles(uploaded_file)
+
+    # 5. Stream in the Background (a bounded, cancellable job)
+    scan = MenuScan()
+    return submit_job(scan, _stream_menu(scan, tiles, cache_key))
+
 # ==========================================
 # 🍹 LOGIC 4: FRESH DRINK ANALYZER
 # ==========================================
+def _parse_drink_row(row):
+    """Turns one 'drink_scanner' table row (column -> cell) into the UI result dict."""
+    v = decode_row(row, DRINK_COLS, DRINK_OUTPUTS)
+    raw_name    = v["output_name"]
+    raw_sugar   = v["output_sugar"]
+    raw_fat     = v["output_fat"]
+    raw_is_bev  = v["output_isBeverage"]
+    raw_comment = v["output_comment"]
+    raw_alt     = v["output_alternative"]
+
+    # Logic: Check if it's a beverage
+    if isinstance(raw_is_bev, bool):
+        is_valid_beverage = raw_is_bev
+    else:
+        is_valid_beverage = str(raw_is_bev).strip().lower() == 'true'
+
+    sugar_100 = clean_number(raw_sugar)
+    fat_100 = clean_number(raw_fat)
+
+    return _grade_result({
+        "name": str(raw_name).strip(),
+        "sugar_g": sugar_100 * 2.5,
+        "fat_g": fat_100 * 2.5,
+        "sugar_100g": sugar_100,
+        "fat_100g": fat_100,
+        "comment": str(raw_comment).strip(),
+        "alternative": str(raw_alt).strip(),
+        "is_beverage": is_valid_beverage,
+        "serving_text": "(250ml)"
+    })
+
 def analyze_drink_with_jamai(uploaded_file, multiplier=1.0, language="English"):
     """
     Sends drink image to JamAI 'drink_scanner' table and returns formatted dict.
+    Blocking form of start_drink_scan (same cache, upload and parsing).
+    """
+    return wait_for_scan(start_drink_scan(uploaded_file, multiplier, language))
+
+def start_drink_scan(uploaded_file, multiplier=1.0, language="English"):
+    """
+    Sends drink image to JamAI 'drink_scanner' table in the background: returns a
+    ScanJob right away (already done for a cached image), or None if the API is
+    not configured.
     """
     # 1. Validation Check
     if not api_key or not PROJECT_ID:
         st.error("❌ Missing API Configuration. Please check your .streamlit/secrets.toml file.")
         return None
 
-    # 2. Initialize JamAI
-    jam = JamAI(token=api_key, project_id=PROJECT_ID)
+    # 2. Prepare Image (orient, strip metadata, downscale, re-encode)
+    uploaded_file = prepare_image(uploaded_file, "drink")
 
-    # 3. Handle File Upload
-    temp_filename = f"temp_drink_{uploaded_file.name}"
-    with open(temp_filename, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    # 3. Check Result Cache
+    job = ScanJob("Drink Analysis")
+    digest = image_digest(uploaded_file.getbuffer())
+    cache_key = _result_key(DRINK_TABLE_ID, digest, multiplier, language)
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        job._finish_now(_grade_result(cached))
+        return job
 
-    try:
-        # 4. Upload File to JamAI Storage
-        upload_response = jam.file.upload_file(temp_filename)
-        image_uri = upload_response.uri
+    # 4. Upload + Add Row in the Background
+    row = lambda image_uri: {
+        DRINK_COLS["image_input"]: image_uri,
+        DRINK_COLS["multiplier_input"]: multiplier,
+        DRINK_COLS["language"]: language
+    }
+    return submit_job(job, _analyze_image_async(uploaded_file, digest, cache_key, DRINK_TABLE_ID, row, _parse_drink_row))
 
-        # 5. Add Row to JamAI Table
-        completion = jam.table.add_table_rows(
-            "action",
-            p.MultiRowAddRequest(
-                table_id=DRINK_TABLE_ID,
-                data=[{
-                    DRINK_COLS["image_input"]: image_uri,
-                    DRINK_COLS["multiplier_input"]: multiplier,
-                    DRINK_COLS["language"]: language
-                }],
-                stream=False
-            )
-        )
+# ==========================================
+# ✍️ LOGIC 5: MANUAL INPUT ANALYZER
+# ==========================================
+def _parse_manual_row(row, text):
+    """Turns one 'manual_input' table row (column -> cell) into the UI result dict."""
+    # Extract values
+    v = decode_row(row, MANUAL_COLS, MANUAL_OUTPUTS)
+    sugar_100 = clean_number(v["output_sugar_100"])
+    sugar_serv = clean_number(v["output_sugar_serving"])
+    fat_100 = clean_number(v["output_fat_100"])
+    fat_serv = clean_number(v["output_fat_serving"])
+    comment = str(v["output_comment"]).strip()
+    alt = str(v["output_alternative"]).strip()
 
-        # 6. Clean up temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+    # If serving values are missing/zero, calculate them (fallback)
+    if sugar_serv == 0 and sugar_100 > 0: sugar_serv = sugar_100 * 2.5
+    if fat_serv == 0 and fat_100 > 0: fat_serv = fat_100 * 2.5
 
-        # 7. Extract Data from Response
-        if completion.rows:
-            row = completion.rows[0].columns
-            
-            # Helper to safely extract content
-            def get_val(col_name):
-                cell = row.get(col_name)
-                if not cell: return "0"
-                if hasattr(cell, "choices") and len(cell.choices) > 0:
-                    return cell.choices[0].message.content
-                if hasattr(cell, "value"):
-                    return cell.value
-                return str(cell)
-
-            raw_name    = get_val(DRINK_COLS["output_name"])
-            raw_sugar   = get_val(DRINK_COLS["output_sugar"])
-            raw_fat     = get_val(DRINK_COLS["output_fat"])
-            raw_grade   = get_val(DRINK_COLS["output_grade"])
-            raw_is_bev  = get_val(DRINK_COLS["output_isBeverage"]) 
-            raw_comment = get_val(DRINK_COLS["output_comment"])
-            raw_alt     = get_val(DRINK_COLS["output_alternative"])
-
-            # Logic: Check if it's a beverage
-            if isinstance(raw_is_bev, bool):
-                is_valid_beverage = raw_is_bev
-            else:
-                is_valid_beverage = str(raw_is_bev).strip().lower() == 'true'
-
-            sugar_100 = clean_number(raw_sugar)
-            fat_100 = clean_number(raw_fat)
-
-            return {
-                "name": str(raw_name).strip(),
-                "grade": str(raw_grade).strip().upper(),
-                "sugar_g": sugar_100 * 2.5,
-                "fat_g": fat_100 * 2.5,
-                "sugar_100g": sugar_100,
-                "fat_100g": fat_100,
-                "comment": str(raw_comment).strip(),
-                "alternative": str(raw_alt).strip(),
-                "is_beverage": is_valid_beverage,
-                "serving_text": "(250ml)"
-            }
-        else:
-            st.error("❌ JamAI returned no rows for drink analysis.")
-            return None
-            
-    except Exception as e:
-        st.error(f"❌ Drink Analysis Error: {e}")
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+    return _grade_result({
+        "name": f"{text}",
+        "sugar_g": sugar_serv,
+        "fat_g": fat_serv,
+        "sugar_100g": sugar_100,
+        "fat_100g": fat_100,
+        "comment": comment,
+        "alternative": alt,
+        "is_beverage": True, # Assume manual input is beverage for now
+        "serving_text": "(250ml)" # Standardize for manual input
+    })
+
+LOCAL_SOURCE_COMMENT = {
+    "English": "📚 From the Cek Manis drink database ({}). Tap Ask AI for advice on this drink.",
+    "Malay": "📚 Daripada pangkalan data minuman Cek Manis ({}). Tekan Tanya AI untuk nasihat tentang minuman ini.",
+}
+
+def _lookup_known_drink(text, multiplier=1.0, language="English"):
+    """
+    Answers a typed drink from the local Dataset.parquet index, without JamAI.
+    Returns the analyzer result dict, or None for drinks the dataset does not know.
+    """
+    index = load_drink_index()
+    entry = index.lookup(text) if index else None
+    if entry is None:
         return None
 
-# ==========================================
-# ✍️ LOGIC 5: MANUAL INPUT ANALYZER
-# ==========================================
+    sugar_100 = entry["sugar_100g"] * multiplier
+    fat_100 = entry["fat_100g"]
+    return {
+        "name": f"{text}",
+        "grade": nutrigrade(sugar_100, fat_100),
+        "sugar_g": sugar_100 * 2.5,
+        "fat_g": fat_100 * 2.5,
+        "sugar_100g": sugar_100,
+        "fat_100g": fat_100,
+        "comment": LOCAL_SOURCE_COMMENT.get(language, LOCAL_SOURCE_COMMENT["English"]).format(entry["name"]),
+        "alternative": "",
+        "is_beverage": True,
+        "serving_text": "(250ml)"
+    }
+
 def analyze_manual_input_with_jamai(text, multiplier=1.0, language="English"):
     """
     Sends text and multiplier to JamAI 'manual_input' table.
+    Known drinks are answered from the local drink index, popular ones from
+    the shared manual lookup cache; only the rest reach the LLM.
     """
     # 1. Validation Check
     if not api_key or not PROJECT_ID:
         st.error("❌ Missing API Configuration.")
         return None
 
-    # 2. Initialize JamAI
-    jam = JamAI(token=api_key, project_id=PROJECT_ID)
+    # 2. Local Drink Index (sub-millisecond, no LLM call)
+    known = _lookup_known_drink(text, multiplier, language)
+    if known is not None:
+        return known
+
+    # 3. Check Manual Lookup Cache (keep the name exactly as this user typed it)
+    cache_key = _manual_key(text, multiplier, language)
+    cached = _manual_cache.get(cache_key)
+    if cached is not None:
+        cached["name"] = f"{text}"
+        return _grade_result(cached)
 
     try:
-        # 3. Add Row to JamAI Table
-        completion = jam.table.add_table_rows(
+        # 4. Add Row to JamAI Table
+        completion = _add_rows(
             "action",
             p.MultiRowAddRequest(
                 table_id=MANUAL_TABLE_ID,
@@ -454,48 +1273,204 @@ def analyze_manual_input_with_jamai(text, multiplier=1.0, language="English"):
             )
         )
 
-        # 4. Extract Data
+        # 5. Extract Data
         if completion.rows:
-            row = completion.rows[0].columns
-            
-            def get_val(col_name):
-                cell = row.get(col_name)
-                if not cell: return "0"
-                if hasattr(cell, "choices") and len(cell.choices) > 0:
-                    return cell.choices[0].message.content
-                if hasattr(cell, "value"):
-                    return cell.value
-                return str(cell)
-
-            # Extract values
-            sugar_100 = clean_number(get_val(MANUAL_COLS["output_sugar_100"]))
-            sugar_serv = clean_number(get_val(MANUAL_COLS["output_sugar_serving"]))
-            fat_100 = clean_number(get_val(MANUAL_COLS["output_fat_100"]))
-            fat_serv = clean_number(get_val(MANUAL_COLS["output_fat_serving"]))
-            grade = str(get_val(MANUAL_COLS["output_grade"])).strip().upper()
-            comment = str(get_val(MANUAL_COLS["output_comment"])).strip()
-            alt = str(get_val(MANUAL_COLS["output_alternative"])).strip()
-
-            # If serving values are missing/zero, calculate them (fallback)
-            if sugar_serv == 0 and sugar_100 > 0: sugar_serv = sugar_100 * 2.5
-            if fat_serv == 0 and fat_100 > 0: fat_serv = fat_100 * 2.5
-
-            return {
-                "name": f"{text}",
-                "grade": grade,
-                "sugar_g": sugar_serv,
-                "fat_g": fat_serv,
-                "sugar_100g": sugar_100,
-                "fat_100g": fat_100,
-                "comment": comment,
-                "alternative": alt,
-                "is_beverage": True, # Assume manual input is beverage for now
-                "serving_text": "(250ml)" # Standardize for manual input
-            }
+            result = _parse_manual_row(completion.rows[0].columns, text)
+            _manual_cache.set(cache_key, result)
+            return result
         else:
             st.error("❌ JamAI returned no rows.")
             return None
 
     except Exception as e:
-        st.error(f"❌ Manual Analysis Error: {e}")
-        return None
\ No newline at end of file
+        # 6. Degraded Mode: JamAI is down, fall back to a clearly labelled local estimate
+        if is_outage(e):
+            st.warning("⚠️ JamAI is unavailable, showing an offline estimate instead.")
+            return estimate_drink(text, multiplier, language)
+        _report_error("Manual Analysis", e)
+        return None
+# ==========================================
+# 📦 LOGIC 6: BATCH ANALYZERS
+# ==========================================
+def _add_rows_batched(table_id, rows):
+    """
+    Adds many rows to one action table with as few requests as possible
+    (MAX_BATCH_ROWS per request). Returns each row's cells in input order;
+    a row that failed is returned as its exception instead.
+    """
+    results = []
+    for start in range(0, len(rows), MAX_BATCH_ROWS):
+        chunk = rows[start:start + MAX_BATCH_ROWS]
+        try:
+            completion = _add_rows(
+                "action",
+                p.MultiRowAddRequest(table_id=table_id, data=chunk, stream=False)
+            )
+            if len(completion.rows) != len(chunk):
+                raise ValueError(f"JamAI returned {len(completion.rows)} rows for {len(chunk)} inputs")
+            results.extend(row.columns for row in completion.rows)
+        except _jamai_errors.BadInputError as e:
+            # One bad row rejects the whole request; retry singly to isolate it
+            if len(chunk) == 1:
+                results.append(e)
+            else:
+                results.extend(_add_rows_batched(table_id, [row])[0] for row in chunk)
+        except Exception as e:
+            results.extend([e] * len(chunk))
+    return results
+
+def _run_batch(keys, cache, build_rows, table_id, parse_row, label):
+    """
+    Shared batch flow: answers what it can from the cache, sends one row per
+    remaining unique key, and parses each row on its own so a bad row only
+    fails itself. Returns results in input order (None for failed items).
+    """
+    results = [cache.get(key) for key in keys]
+    results = [None if cached is None else _grade_result(cached) for cached in results]
+
+    # 1. Unique cache misses (duplicates in one batch are sent once)
+    pending = {}
+    for index, key in enumerate(keys):
+        if results[index] is None:
+            pending.setdefault(key, []).append(index)
+
+    errors = []
+    if pending:
+        first_indices = [indices[0] for indices in pending.values()]
+
+        # 2. Build Rows (may fail per item, e.g. an upload)
+        rows = build_rows(first_indices)
+        sendable = [(key, row) for key, row in zip(pending, rows) if not isinstance(row, Exception)]
+        errors.extend(row for row in rows if isinstance(row, Exception))
+
+        # 3. Add Rows + Extract Data (one request per MAX_BATCH_ROWS)
+        cells = _add_rows_batched(table_id, [row for _, row in sendable])
+        for (key, _), row_cells in zip(sendable, cells):
+            try:
+                if isinstance(row_cells, Exception):
+                    raise row_cells
+                result = parse_row(row_cells, pending[key][0])
+            except Exception as e:
+                errors.append(e)
+                continue
+            cache.set(key, result)
+            for index in pending[key]:
+                results[index] = dict(result)
+
+    if errors:
+        st.error(f"❌ {label}: {len(errors)} item(s) could not be analyzed ({errors[0]}).")
+    return results
+
+def _upload_images_concurrently(uploaded_files, digests):
+    """Uploads several images at once on the JamAI loop. Failed uploads come back as exceptions."""
+    _get_pooled_client(api_key, PROJECT_ID)  # Health-check here; the loop thread skips it
+    return gather_in_background(*(
+        upload_image_async(uploaded_file, digest)
+        for uploaded_file, digest in zip(uploaded_files, digests)
+    )).result()
+
+def analyze_images_with_jamai(uploaded_files, language="English"):
+    """
+    Batch analyze_image_with_jamai: one 'scanner' request for all images.
+    Returns one result per image, in input order (None where it failed).
+    """
+    # 1. Validation Check
+    if not api_key or not PROJECT_ID:
+        st.error("❌ Missing API Configuration. Please check your .streamlit/secrets.toml file.")
+        return [None] * len(uploaded_files)
+
+    # 2. Prepare Images + Hash
+    uploaded_files = [prepare_image(f, "label") for f in uploaded_files]
+    digests = [image_digest(f.getbuffer()) for f in uploaded_files]
+
+    def build_rows(indices):
+        uris = _upload_images_concurrently([uploaded_files[i] for i in indices], [digests[i] for i in indices])
+        return [
+            uri if isinstance(uri, Exception) else {
+                IMAGE_COLS["image_input"]: uri,
+                IMAGE_COLS["language"]: language
+            }
+            for uri in uris
+        ]
+
+    return _run_batch(
+        [_result_key(IMAGE_TABLE_ID, digest, language=language) for digest in digests],
+        _result_cache, build_rows, IMAGE_TABLE_ID,
+        lambda row, _: _parse_image_row(row),
+        "Image Analysis"
+    )
+
+def analyze_drinks_with_jamai(uploaded_files, multiplier=1.0, language="English"):
+    """
+    Batch analyze_drink_with_jamai: one 'drink_scanner' request for all images.
+    Returns one result per image, in input order (None where it failed).
+    """
+    # 1. Validation Check
+    if not api_key or not PROJECT_ID:
+        st.error("❌ Missing API Configuration. Please check your .streamlit/secrets.toml file.")
+        return [None] * len(uploaded_files)
+
+    # 2. Prepare Images + Hash
+    uploaded_files = [prepare_image(f, "drink") for f in uploaded_files]
+    digests = [image_digest(f.getbuffer()) for f in uploaded_files]
+
+    def build_rows(indices):
+        uris = _upload_images_concurrently([uploaded_files[i] for i in indices], [digests[i] for i in indices])
+        return [
+            uri if isinstance(uri, Exception) else {
+                DRINK_COLS["image_input"]: uri,
+                DRINK_COLS["multiplier_input"]: multiplier,
+                DRINK_COLS["language"]: language
+            }
+            for uri in uris
+        ]
+
+    return _run_batch(
+        [_result_key(DRINK_TABLE_ID, digest, multiplier, language) for digest in digests],
+        _result_cache, build_rows, DRINK_TABLE_ID,
+        lambda row, _: _parse_drink_row(row),
+        "Drink Analysis"
+    )
+
+def analyze_manual_inputs_with_jamai(texts, multiplier=1.0, language="English"):
+    """
+    Batch analyze_manual_input_with_jamai: one 'manual_input' request for all
+    drink names (spelling variants of the same drink are asked once).
+    Returns one result per name, in input order (None where it failed).
+    """
+    # 1. Validation Check
+    if not api_key or not PROJECT_ID:
+        st.error("❌ Missing API Configuration.")
+        return [None] * len(texts)
+
+    # 2. Local Drink Index first; only unknown drinks go to JamAI
+    known = [_lookup_known_drink(text, multiplier, language) for text in texts]
+    unknown = [i for i, result in enumerate(known) if result is None]
+    pending = [texts[i] for i in unknown]
+
+    def build_rows(indices):
+        return [
+            {
+                MANUAL_COLS["text_input"]: pending[i],
+                MANUAL_COLS["multiplier_input"]: multiplier,
+                MANUAL_COLS["language"]: language
+            }
+            for i in indices
+        ]
+
+    results = _run_batch(
+        [_manual_key(text, multiplier, language) for text in pending],
+        _manual_cache, build_rows, MANUAL_TABLE_ID,
+        lambda row, index: _parse_manual_row(row, pending[index]),
+        "Manual Analysis"
+    )
+
+    # Keep each name exactly as it was typed
+    for text, result in zip(pending, results):
+        if result is not None:
+            result["name"] = f"{text}"
+
+    # 3. Merge back into input order
+    for i, result in zip(unknown, results):
+        known[i] = result
+    return known
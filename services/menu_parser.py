@@ -0,0 +1,221 @@
+import re
+import json
+from utils.grading import SERVING_ML
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# 1. Key Variants the 'menu' table has produced for each field
+# Keys are compared lower-cased with everything but letters and digits removed,
+# so "sugar_per_serving", "Sugar per serving" and "sugarPerServing" are one key.
+FIELD_KEYS = {
+    "name": ["name", "drink", "drinkname", "item", "itemname", "beverage"],
+    "sugar_g": ["sugarperserving", "sugarg", "sugarserving", "sugar"],
+    "fat_g": ["saturatedfatperserving", "fatg", "saturatedfatg", "fatperserving", "saturatedfat", "fat"],
+    "sugar_100g": ["sugarper100ml", "sugar100ml", "sugarper100g", "sugar100g"],
+    "fat_100g": ["saturatedfatper", "saturatedfatper100ml", "saturatedfat100ml", "fatper100ml", "fat100ml", "fat100g"],
+}
+
+# ==========================================
+# 🧹 SCHEMA NORMALIZATION
+# ==========================================
+def _compact(key):
+    return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+def _to_float(value):
+    """12 -> 12.0, "12.5g" -> 12.5, None / "-" -> None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d+(\.\d+)?", str(value or ""))
+    return float(match.group()) if match else None
+
+def _field(compact_item, field):
+    for key in FIELD_KEYS[field]:
+        if key in compact_item:
+            return compact_item[key]
+    return None
+
+def _has_name(obj):
+    return _field({_compact(k): v for k, v in obj.items()}, "name") is not None
+
+def merge_nested_values(obj):
+    """
+    Lifts the values of nested unnamed dicts into the item itself, e.g.
+    {"name": "Teh C", "nutrition": {"sugar_per_100ml": 8}} -> {"name": "Teh C", "sugar_per_100ml": 8}.
+    The item's own keys win; nested dicts with a name (other drinks) are left alone.
+    """
+    merged = {k: v for k, v in obj.items() if not (isinstance(v, dict) and not _has_name(v))}
+    for value in obj.values():
+        if isinstance(value, dict) and not _has_name(value):
+            for key, nested in merge_nested_values(value).items():
+                merged.setdefault(key, nested)
+    return merged
+
+def is_menu_item(obj):
+    """True for a dict that describes one drink (as opposed to a wrapper or metadata)."""
+    if not isinstance(obj, dict):
+        return False
+    compact_item = {_compact(k): v for k, v in obj.items()}
+    return _field(compact_item, "name") is not None or _field(compact_item, "sugar_g") is not None
+
+def normalize_menu_item(item):
+    """
+    Maps one raw menu item (any known key variant) to the structure the
+    Scanner uses: name, sugar_g, fat_g (per serving), sugar_100g, fat_100g.
+    A value only known per serving or only per 100 ml is derived from the other.
+    """
+    compact_item = {_compact(k): v for k, v in item.items()}
+
+    sugar_g = _to_float(_field(compact_item, "sugar_g"))
+    fat_g = _to_float(_field(compact_item, "fat_g"))
+    sugar_100 = _to_float(_field(compact_item, "sugar_100g"))
+    fat_100 = _to_float(_field(compact_item, "fat_100g"))
+
+    per_100 = 100.0 / SERVING_ML
+    if sugar_100 is None and sugar_g is not None:
+        sugar_100 = sugar_g * per_100
+    if sugar_g is None and sugar_100 is not None:
+        sugar_g = sugar_100 / per_100
+    if fat_100 is None and fat_g is not None:
+        fat_100 = fat_g * per_100
+    if fat_g is None and fat_100 is not None:
+        fat_g = fat_100 / per_100
+
+    name = str(_field(compact_item, "name") or "").strip()
+    return {
+        "name": name or "Unknown Item",
+        "sugar_g": sugar_g or 0.0,
+        "fat_g": fat_g or 0.0,
+        "sugar_100g": sugar_100 or 0.0,
+        "fat_100g": fat_100 or 0.0,
+    }
+
+# ==========================================
+# 🧩 INCREMENTAL PARSER
+# ==========================================
+def _repair(text):
+    """Fixes the slips LLMs make most often: trailing commas and single quotes."""
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+    if '"' not in text:
+        text = text.replace("'", '"')
+    return text
+
+class MenuStreamParser:
+    """
+    Pulls menu items out of the 'menu' table's output as it arrives.
+
+    Object boundaries are found by a scan that knows about strings and
+    escapes (a "}" inside a name is just text), and every {...} is decoded
+    on its own as soon as it closes (as-is, then repaired). So code fences,
+    wrapper keys, prose around the JSON, a malformed item or a cut-off tail
+    only lose the part that is actually broken.
+      - an object with a name is one drink (nested unnamed dicts such as
+        "nutrition": {...} are merged into it, see merge_nested_values)
+      - an unnamed object that is the value of a key belongs to its parent
+      - any other object with drink fields is a drink without a name
+    feed() returns the items completed by each new chunk.
+    """
+
+    def __init__(self):
+        self.items = []      # Normalized items, in the order they appeared
+        self.skipped = 0     # Complete-looking objects that could not be decoded
+        self._buffer = ""
+        self._pos = 0        # Next character to scan
+        self._stack = []     # Open containers: ["{" or "[", start, has_broken_child]
+        self._in_string = False
+        self._escaped = False
+
+    def _decode(self, text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                return json.loads(_repair(text))
+            except json.JSONDecodeError:
+                return None
+
+    def _close_object(self, frame, end, new_items):
+        """Handles one just-closed {...} (frame = its stack entry, end = index of its "}")."""
+        parent = self._stack[-1] if self._stack else None
+        obj = self._decode(self._buffer[frame[1]:end + 1])
+
+        # 1. Broken: count it once (not again for every wrapper around it)
+        if not isinstance(obj, dict):
+            if not frame[2]:
+                self.skipped += 1
+            if parent is not None:
+                parent[2] = True
+            return
+
+        # 2. Part of its parent (e.g. "nutrition": {...}), merged when the parent closes
+        if parent is not None and parent[0] == "{" and not _has_name(obj):
+            return
+
+        obj = merge_nested_values(obj)
+        if is_menu_item(obj):
+            item = normalize_menu_item(obj)
+            self.items.append(item)
+            new_items.append(item)
+
+    def feed(self, chunk):
+        self._buffer += chunk or ""
+        new_items = []
+        buffer = self._buffer
+
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+
+            # 1. Inside a string only the closing quote matters
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            # 2. Structure (quotes outside any object are prose, e.g. a "quoted" intro)
+            if ch == '"' and self._stack:
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append([ch, i, False])
+            elif ch in "}]":
+                opener = "{" if ch == "}" else "["
+                if not any(frame[0] == opener for frame in self._stack):
+                    continue  # Stray closer
+                while True:
+                    frame = self._stack.pop()
+                    if frame[0] == opener:
+                        break
+                if opener == "{":
+                    self._close_object(frame, i, new_items)
+        self._pos = len(buffer)
+
+        # 3. Drop text no open object needs any more, so long menus stay small
+        if not self._stack:
+            self._buffer = ""
+            self._pos = 0
+        elif self._stack[0][1] > 0:
+            cut = self._stack[0][1]
+            self._buffer = buffer[cut:]
+            self._pos -= cut
+            for frame in self._stack:
+                frame[1] -= cut
+        return new_items
+
+    @property
+    def complete(self):
+        """True if everything fed so far parsed cleanly and no object was left open."""
+        return self.skipped == 0 and not any(frame[0] == "{" for frame in self._stack)
+
+def parse_menu_output(raw_text):
+    """
+    Parses a whole 'menu' table output at once.
+    Returns (items, complete): every salvageable item, and whether nothing was lost.
+    """
+    parser = MenuStreamParser()
+    parser.feed(str(raw_text or ""))
+    return parser.items, parser.complete
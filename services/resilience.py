@@ -0,0 +1,187 @@
+import time
+import random
+import asyncio
+import threading
+import httpx
+from functools import lru_cache
+from utils.lazy_import import LazyModule
+
+# Loaded on first use (importing jamaibase pulls in its whole client, ~1.5 s)
+_jamai_errors = LazyModule("jamaibase.utils.exceptions")
+
+# ==========================================
+# 🚦 ERRORS
+# ==========================================
+class CircuitOpenError(Exception):
+    """Raised instead of calling JamAI while the circuit breaker is open."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"JamAI is temporarily unavailable (retrying in {retry_in:.0f}s)")
+        self.retry_in = retry_in
+
+class BudgetExceededError(TimeoutError):
+    """Raised when a call (including its retries) runs past its time budget."""
+
+@lru_cache(maxsize=1)
+def retryable_errors():
+    """Errors worth another attempt: network trouble, timeouts and "try again later" answers."""
+    return (
+        httpx.TransportError,
+        _jamai_errors.RateLimitExceedError,
+        _jamai_errors.ServerBusyError,
+        _jamai_errors.UnexpectedError,
+        _jamai_errors.ModelOverloadError,
+        _jamai_errors.UpStreamError,
+        _jamai_errors.UnavailableError,
+    )
+
+def transport_error(error):
+    """
+    The httpx.TransportError behind an error, or None. The jamaibase client
+    wraps network failures in a plain JamaiException, with the httpx error
+    only in __cause__, so the cause chain is walked.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, httpx.TransportError):
+            return error
+        seen.add(id(error))
+        error = error.__cause__
+    return None
+
+def is_timeout(error):
+    """True if the error (or the network error it wraps) is an httpx timeout."""
+    return isinstance(transport_error(error), httpx.TimeoutException)
+
+def is_outage(error):
+    """True for errors that mean JamAI itself is struggling (not a bad request)."""
+    if isinstance(error, retryable_errors() + (CircuitOpenError, BudgetExceededError)):
+        return True
+    return transport_error(error) is not None
+
+# ==========================================
+# 🔌 CIRCUIT BREAKER
+# ==========================================
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` outage errors in a row.
+    After `reset_timeout` seconds one trial call is let through (half-open);
+    its success closes the circuit again, its failure re-opens it.
+    Shared by every session, so one incident does not pile up threads.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError unless a call may go out right now.
+        Returns True if this call is the half-open trial (see record_cancelled).
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout or self._trial_running:
+                raise CircuitOpenError(max(0.0, self.reset_timeout - waited))
+            # Half-open: let exactly one trial call through
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_cancelled(self, was_trial):
+        """A call was cancelled before it finished; it says nothing about JamAI's health."""
+        if was_trial:
+            with self._lock:
+                self._trial_running = False
+
+    def record_failure(self, error):
+        """Counts outage errors only; a bad request says nothing about JamAI's health."""
+        with self._lock:
+            self._trial_running = False
+            if not is_outage(error):
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+# ==========================================
+# 🔁 RETRY WITH BACKOFF + TIME BUDGET
+# ==========================================
+def _backoff_delay(attempt, error, base_delay, max_delay):
+    """Full-jitter exponential backoff; honours JamAI's Retry-After on 429s."""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        return float(retry_after)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def call_with_retry(action, budget, breaker, attempts=3, base_delay=0.5, max_delay=8.0):
+    """
+    Runs action(timeout) until it succeeds, retrying retryable errors with
+    jittered backoff. Every attempt gets the time left in `budget` (seconds)
+    as its timeout, so the whole call never runs past the budget.
+    """
+    deadline = time.monotonic() + budget
+    for attempt in range(attempts):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BudgetExceededError(f"JamAI did not answer within {budget:.0f}s")
+        was_trial = breaker.before_call()
+        try:
+            result = action(remaining)
+        except Exception as e:
+            breaker.record_failure(e)
+            if is_timeout(e):
+                e = BudgetExceededError(f"JamAI did not answer within {budget:.0f}s")
+            delay = _backoff_delay(attempt, e, base_delay, max_delay)
+            if not is_outage(e) or attempt == attempts - 1 or time.monotonic() + delay >= deadline:
+                raise e
+            time.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled (e.g. an abandoned scan or prefetch): free the trial slot
+            breaker.record_cancelled(was_trial)
+            raise
+        breaker.record_success()
+        return result
+
+async def call_with_retry_async(action, budget, breaker, attempts=3, base_delay=0.5, max_delay=8.0):
+    """Async call_with_retry: awaits action(timeout) and sleeps without blocking the loop."""
+    deadline = time.monotonic() + budget
+    for attempt in range(attempts):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BudgetExceededError(f"JamAI did not answer within {budget:.0f}s")
+        was_trial = breaker.before_call()
+        try:
+            result = await action(remaining)
+        except Exception as e:
+            breaker.record_failure(e)
+            if is_timeout(e):
+                e = BudgetExceededError(f"JamAI did not answer within {budget:.0f}s")
+            delay = _backoff_delay(attempt, e, base_delay, max_delay)
+            if not is_outage(e) or attempt == attempts - 1 or time.monotonic() + delay >= deadline:
+                raise e
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled (e.g. an abandoned scan or prefetch): free the trial slot
+            breaker.record_cancelled(was_trial)
+            raise
+        breaker.record_success()
+        return result
@@ -0,0 +1,139 @@
+import re
+import unicodedata
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# 1. Phrase Variants (checked before single words, longest first)
+# Several ways of ordering the same thing at a mamak / kopitiam.
+PHRASE_VARIANTS = {
+    "less sweet": "kurang manis",
+    "less sugar": "kurang manis",
+    "kurang gula": "kurang manis",
+    "siew dai": "kurang manis",
+    "siu dai": "kurang manis",
+    "no sugar": "kosong",
+    "without sugar": "kosong",
+    "tanpa gula": "kosong",
+    "ice blended": "blended",
+    "100 plus": "100plus",
+}
+
+# 2. Word Variants (Malay / English / typo spellings -> one canonical word)
+WORD_VARIANTS = {
+    "tea": "teh",
+    "the": "teh",
+    "coffee": "kopi",
+    "kofi": "kopi",
+    "ice": "peng",
+    "iced": "peng",
+    "ais": "peng",
+    "si": "c",
+    "see": "c",
+    "milk": "susu",
+    "chocolate": "coklat",
+    "choc": "coklat",
+    "lime": "limau",
+    "syrup": "sirap",
+}
+
+# 3. Filler Words dropped from chat questions before they are compared
+# ("the" must go before drink normalization, which reads it as a typo of "teh")
+QUESTION_STOP_WORDS = {
+    "a", "an", "the", "is", "are", "am", "do", "does", "can", "could", "would",
+    "please", "pls", "plz", "i", "me", "my", "you", "your", "it", "this", "that",
+    "of", "for", "to", "in", "on", "so", "just", "really", "very",
+    "ke", "ini", "ni", "itu", "tu", "ada", "saya", "awak", "kah", "lah", "ah",
+}
+
+# 4. Key Words: two questions only count as the same if these match exactly
+# (normalized forms). Any word with a digit counts too ("250ml", "50%", "2").
+NEGATION_WORDS = {
+    "not", "no", "never", "cannot", "none", "nothing",
+    "tak", "x", "tidak", "bukan", "jangan", "tiada", "belum", "boleh",
+}
+DRINK_WORDS = {
+    "teh", "kopi", "milo", "horlicks", "neslo", "nescafe", "cham", "bandung",
+    "o", "c", "susu", "tarik", "peng", "kosong", "kurang", "manis", "halia",
+    "limau", "sirap", "coklat", "latte", "blended", "soya", "tebu", "kelapa",
+    "100plus", "coke", "cola", "pepsi", "sprite", "7up", "sarsi", "fanta",
+}
+SUBJECT_WORDS = {
+    "kid", "kids", "child", "children", "baby", "toddler", "elderly", "adult", "adults",
+    "pregnant", "diabetes", "diabetic", "diabetics", "prediabetes", "obese",
+    "budak", "kanak", "bayi", "warga", "emas", "dewasa", "hamil", "mengandung", "kencing",
+}
+
+# ==========================================
+# 🔤 NORMALIZATION
+# ==========================================
+def normalize_drink_name(text):
+    """
+    Canonical form of a drink name, e.g. "Iced Tea-C" / "teh c ais" -> "teh c peng".
+    Case, accents, punctuation, whitespace and common spelling variants are folded.
+    """
+    if not text:
+        return ""
+
+    # 1. Unicode + Case Folding (full-width chars, fancy hyphens, accents)
+    text = unicodedata.normalize("NFKD", str(text)).casefold()
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+
+    # 2. Punctuation -> Spaces (keeps "%" so "50% sugar" stays meaningful)
+    text = re.sub(r"[^\w%]+", " ", text).strip()
+
+    # 3. Phrase Variants
+    for phrase in sorted(PHRASE_VARIANTS, key=len, reverse=True):
+        text = re.sub(rf"\b{re.escape(phrase)}\b", PHRASE_VARIANTS[phrase], text)
+
+    # 4. Word Variants
+    words = [WORD_VARIANTS.get(word, word) for word in text.split()]
+
+    # 5. "Iced X" and "X ais" are the same order -> "peng" always goes last
+    if "peng" in words:
+        words = [word for word in words if word != "peng"] + ["peng"]
+    return " ".join(words)
+
+def normalize_question(text):
+    """
+    Canonical form of a chat question, e.g. "Is the Teh Tarik healthy??" ->
+    "teh tarik healthy". Drops filler words, then folds like a drink name.
+    """
+    text = unicodedata.normalize("NFKC", str(text or "")).casefold()
+
+    # "can't" / "don't" -> "cannot" / "do not", so the negation survives as a word
+    text = re.sub(r"\bcan[’']t\b", "cannot", text)
+    text = re.sub(r"\bwon[’']t\b", "will not", text)
+    text = re.sub(r"n[’']t\b", " not", text)
+
+    words = re.sub(r"[^\w%]+", " ", text).split()
+    return normalize_drink_name(" ".join(word for word in words if word not in QUESTION_STOP_WORDS))
+
+def question_keywords(normalized):
+    """
+    Words of a normalized question that change its meaning however similar
+    the rest is: drinks, negations, who it is for and numbers
+    ("tak boleh minum teh o" -> {"tak", "boleh", "teh", "o"}).
+    """
+    return frozenset(
+        word for word in normalized.split()
+        if word in DRINK_WORDS or word in NEGATION_WORDS or word in SUBJECT_WORDS
+        or any(ch.isdigit() for ch in word)
+    )
+
+# ==========================================
+# 🔡 CHARACTER N-GRAMS
+# ==========================================
+def char_ngrams(text, n=3):
+    """
+    Set of character n-grams of a (normalized) string, padded so word starts
+    and ends count too: "teh" -> {"  t", " te", "teh", "eh "}.
+    """
+    padded = f"{' ' * (n - 1)}{text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+def dice_similarity(grams_a, grams_b):
+    """Dice coefficient of two n-gram sets: 1.0 = identical, 0.0 = nothing shared."""
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import weakref
+import streamlit as st
+from services.cache import CACHE_DIR
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+# 1. Retention: a conversation is deleted when its session ends (tab closed and
+# expired by Streamlit), and in any case once untouched for this long
+TRANSCRIPT_TTL = 2 * 60 * 60       # Seconds
+TRANSCRIPT_PURGE_INTERVAL = 5 * 60  # Seconds between sweeps for expired conversations
+
+# ==========================================
+# 📜 CHAT TRANSCRIPT STORE
+# ==========================================
+class TranscriptStore:
+    """
+    Chat messages of every session in one SQLite file, zlib-compressed and
+    readable only by the server's user. The Chat page keeps only its latest
+    messages in session_state and pages older ones in from here on demand.
+    Safe to share between threads.
+    """
+
+    def __init__(self, name="chat_transcripts", ttl=TRANSCRIPT_TTL):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.name = name
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.ttl = ttl
+
+        # The cache folder is in the shared temp dir: only the server's user may read
+        # this file (SQLite gives its -wal / -shm files the same permissions)
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(self.path, 0o600)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (session, seq))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_created ON messages (created)")
+        self._conn.commit()
+        self._last_purge = 0.0
+        self.purge_expired()
+
+    def purge_expired(self):
+        """Deletes conversations nobody has touched within the TTL. Returns the number of messages removed."""
+        with self._lock:
+            self._last_purge = time.monotonic()
+            cursor = self._conn.execute(
+                "DELETE FROM messages WHERE session IN ("
+                " SELECT session FROM messages GROUP BY session HAVING MAX(created) < ?)",
+                (time.time() - self.ttl,),
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def append(self, session_id, role, content):
+        """Stores one message at the end of a conversation. Returns its sequence number."""
+        if time.monotonic() - self._last_purge > TRANSCRIPT_PURGE_INTERVAL:
+            self.purge_expired()
+        with self._lock:
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session = ?", (session_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO messages (session, seq, role, content, created) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, role, zlib.compress(str(content).encode("utf-8")), time.time()),
+            )
+            self._conn.commit()
+        return seq
+
+    def page(self, session_id, before, limit):
+        """The `limit` messages just before sequence number `before`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, role, content FROM messages WHERE session = ? AND seq < ?"
+                " ORDER BY seq DESC LIMIT ?",
+                (session_id, before, limit),
+            ).fetchall()
+        return [
+            {"role": role, "content": zlib.decompress(content).decode("utf-8"), "seq": seq}
+            for seq, role, content in reversed(rows)
+        ]
+
+    def count(self, session_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session = ?", (session_id,)
+            ).fetchone()[0]
+
+    def clear(self, session_id):
+        """Deletes one conversation. Returns the number of messages removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+            self._conn.commit()
+        return cursor.rowcount
+
+@st.cache_resource(show_spinner=False)
+def get_transcript_store():
+    """One transcript store per server process, shared by every session."""
+    return TranscriptStore()
+
+class _SessionEnd:
+    """Kept in one session's session_state; dropped (and collected) when Streamlit ends the session."""
+
+def clear_on_session_end(store, session_id):
+    """Deletes this session's conversation from store once the session ends."""
+    if "transcript_session_end" not in st.session_state:
+        marker = _SessionEnd()
+        weakref.finalize(marker, store.clear, session_id)
+        st.session_state.transcript_session_end = marker
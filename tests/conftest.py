@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import pytest
+import streamlit as st
+from streamlit import config
+
+# The app's modules are imported as top-level packages (services, utils, ...)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep test caches out of the real cache directory
+os.environ.setdefault("CEKMANIS_CACHE_DIR", tempfile.mkdtemp(prefix="cekmanis_test_cache_"))
+
+# services.jamai_service reads st.secrets at import; point it at dummy credentials
+_secrets_path = os.path.join(tempfile.mkdtemp(prefix="cekmanis_test_secrets_"), "secrets.toml")
+with open(_secrets_path, "w", encoding="utf-8") as f:
+    f.write('JAMAI_API_KEY = "test_key"\nJAMAI_PROJECT_ID = "test_project"\n')
+config.set_option("secrets.files", [_secrets_path])
+
+# Nothing listens here: every request fails with a connection error
+UNREACHABLE_API_BASE = "http://127.0.0.1:9/api"
+
+@pytest.fixture
+def unreachable_client():
+    """A real jamaibase client whose API base refuses connections."""
+    from jamaibase import JamAI
+
+    return JamAI(token="test_key", project_id="test_project", api_base=UNREACHABLE_API_BASE)
+
+class _SessionState(dict):
+    """Stand-in for st.session_state, which does not persist in bare mode."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+@pytest.fixture
+def session(monkeypatch):
+    """Starts a fresh user session; call it again to switch to another user."""
+    monkeypatch.setattr(st, "session_state", _SessionState())
+
+    def new_session():
+        # Not via monkeypatch, which would keep the old session alive until teardown
+        st.session_state = _SessionState()
+    return new_session
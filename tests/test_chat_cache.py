@@ -0,0 +1,45 @@
+import pytest
+from services.cache import SimilarityCache
+from services.jamai_service import CHAT_CACHE_MIN_SCORE
+from services.text_utils import normalize_question
+
+SCOPE = ("chat", "English")
+
+@pytest.fixture
+def cache():
+    return SimilarityCache("test_chat_answers", min_score=CHAT_CACHE_MIN_SCORE)
+
+# ==========================================
+# 🚫 DIFFERENT QUESTIONS, DIFFERENT ANSWERS
+# ==========================================
+@pytest.mark.parametrize("asked, stored", [
+    ("boleh minum teh?", "tak boleh minum teh?"),
+    ("tak boleh minum teh?", "boleh minum teh?"),
+    ("Is teh o healthy?", "Is teh c healthy?"),
+    ("How much sugar in kopi o?", "How much sugar in kopi c?"),
+    ("Is kopi good for me?", "Is milo good for me?"),
+    ("Should I drink teh tarik?", "Should I not drink teh tarik?"),
+    ("Should I drink teh tarik?", "Shouldn't I drink teh tarik?"),
+    ("How much sugar per day?", "How much sugar per day for kids?"),
+    ("Is one 250ml can ok?", "Is one 500ml can ok?"),
+])
+def test_different_questions_do_not_share_an_answer(cache, asked, stored):
+    cache.set(SCOPE, stored, "stored answer")
+    assert cache.get(SCOPE, asked) is None
+
+def test_negation_words_are_kept():
+    assert normalize_question("Tak boleh minum teh?") == "tak boleh minum teh"
+    assert normalize_question("Should I not drink kopi?") != normalize_question("Should I drink kopi?")
+    assert normalize_question("Don't I need water?") == normalize_question("Do I not need water?")
+
+# ==========================================
+# ✅ SAME QUESTION, REWORDED
+# ==========================================
+@pytest.mark.parametrize("asked, stored", [
+    ("is teh tarik healthy", "Is the Teh Tarik healthy??"),
+    ("Iced teh c, is it ok?", "teh c ais is it ok"),
+    ("what is the healthiest drink here", "What is the healthiest drink here?"),
+])
+def test_reworded_questions_share_an_answer(cache, asked, stored):
+    cache.set(SCOPE, stored, "stored answer")
+    assert cache.get(SCOPE, asked) == "stored answer"
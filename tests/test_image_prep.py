@@ -0,0 +1,90 @@
+import io
+from PIL import Image, ImageDraw, ImageFont
+from services.image_prep import (
+    PreparedImage, find_near_duplicate, perceptual_hash, prepare_image, remember_scan, same_picture,
+)
+
+SCOPE = ("Nutrition Label", "English")
+
+def _label(sugar, quality=85):
+    """A prepared photo of a nutrition label; only the sugar value varies."""
+    font = ImageFont.load_default(size=34)
+    img = Image.new("RGB", (900, 1200), "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((40, 30), "Nutrition Facts", fill="black", font=font)
+    rows = [("Energy", "180 kcal"), ("Protein", "2.0 g"), ("Fat", "3.5 g"), ("Sugars", f"{sugar} g")]
+    for i, (name, value) in enumerate(rows):
+        y = 120 + i * 70
+        draw.line((40, y - 10, 860, y - 10), fill="black", width=2)
+        draw.text((40, y), name, fill="black", font=font)
+        draw.text((650, y), value, fill="black", font=font)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return PreparedImage(out.getvalue(), "label.jpg", out.tell())
+
+# ==========================================
+# 👁️ NEAR-DUPLICATE SCANS
+# ==========================================
+def test_labels_with_different_values_are_not_reused(session):
+    remember_scan(SCOPE, _label("12.5"), {"sugar": 12.5})
+
+    # The hash alone cannot tell them apart; the pixel check must
+    assert perceptual_hash(_label("12.5")) == perceptual_hash(_label("18.5"))
+    assert find_near_duplicate(SCOPE, _label("18.5")) is None
+    assert find_near_duplicate(SCOPE, _label("12.0")) is None
+
+def test_same_picture_re_encoded_is_reused(session):
+    remember_scan(SCOPE, _label("12.5"), {"sugar": 12.5})
+
+    assert find_near_duplicate(SCOPE, _label("12.5")) == {"sugar": 12.5}
+    assert find_near_duplicate(SCOPE, _label("12.5", quality=60)) == {"sugar": 12.5}
+
+def test_results_are_not_shared_between_sessions(session):
+    remember_scan(SCOPE, _label("12.5"), {"sugar": 12.5})
+
+    session()  # Another user
+    assert find_near_duplicate(SCOPE, _label("12.5")) is None
+
+def test_results_are_scoped_by_mode_and_language(session):
+    remember_scan(SCOPE, _label("12.5"), {"sugar": 12.5})
+
+    assert find_near_duplicate(("Nutrition Label", "Malay"), _label("12.5")) is None
+
+def test_same_picture_rejects_different_sizes():
+    small = io.BytesIO()
+    Image.new("RGB", (450, 600), "white").save(small, format="JPEG")
+    assert not same_picture(_label("12.5").getvalue(), small.getvalue())
+
+# ==========================================
+# 🖼️ PREPARED IMAGE
+# ==========================================
+class _Upload(io.BytesIO):
+    """Stand-in for a Streamlit UploadedFile (getbuffer() + name)."""
+    def __init__(self, data, name="photo.jpg"):
+        super().__init__(data)
+        self.name = name
+
+def _jpeg(size=(600, 800), quality=40, orientation=None):
+    # Photo-like noise: at quality 40 it is smaller than any re-encode at the profile's quality
+    img = Image.merge("RGB", [Image.effect_noise(size, 40).point(lambda v: v // 2 + 64)] * 3)
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality, exif=exif)
+    return out.getvalue()
+
+def test_small_compressed_jpeg_is_uploaded_unchanged():
+    data = _jpeg()
+    prepared = prepare_image(_Upload(data), "label")
+
+    assert prepared.getvalue() == data
+    assert prepared.bytes_saved == 0
+
+def test_sideways_photo_is_turned_upright():
+    prepared = prepare_image(_Upload(_jpeg(orientation=6)), "label")  # Rotated 90° on the phone
+
+    with Image.open(io.BytesIO(prepared.getvalue())) as img:
+        assert img.size == (800, 600)
+        assert img.getexif().get(0x0112) is None
@@ -0,0 +1,24 @@
+import pytest
+from utils.import_report import DEFERRED_MODULES, PAGE_BUDGETS_MS, _run_probe, measure_page
+
+# ==========================================
+# ⏱️ PAGE IMPORT BUDGETS
+# ==========================================
+@pytest.fixture(scope="module", params=sorted(PAGE_BUDGETS_MS))
+def page_result(request):
+    """measure_page() of each page (fresh interpreters, so measured once per page)."""
+    return request.param, measure_page(request.param)
+
+def test_page_imports_within_budget(page_result):
+    page, result = page_result
+    assert result["ms"] <= PAGE_BUDGETS_MS[page], f"{page}: {result['ms']:.0f} ms, slowest {result['slowest']}"
+
+@pytest.mark.parametrize("module", ["plotly", "pandas", "jamaibase"])
+def test_heavy_modules_are_not_imported_eagerly(page_result, module):
+    page, result = page_result
+    assert module in DEFERRED_MODULES
+    assert module not in result["loaded"], f"{page} imports {module} at load"
+
+def test_probe_sees_modules_streamlit_already_loaded():
+    # streamlit may import plotly itself; an app import of it must still count
+    assert _run_probe(["import plotly.graph_objects"])["loaded"] == ["plotly"]
@@ -0,0 +1,265 @@
+import time
+import asyncio
+import httpx
+import pytest
+from types import SimpleNamespace
+from jamaibase.utils.exceptions import BadInputError, JamaiException
+import services.jamai_service as js
+from services.image_prep import PreparedImage
+
+def _wrapped_network_error():
+    """A dropped connection as jamaibase reports it: JamaiException chained to the httpx error."""
+    try:
+        raise JamaiException("connection dropped") from httpx.ConnectError("connection dropped")
+    except JamaiException as e:
+        return e
+
+# ==========================================
+# 🔌 POOLED CLIENT
+# ==========================================
+@pytest.fixture
+def no_health_probe():
+    """Marks the pooled client as just probed, so fetching it makes no network call."""
+    js._last_health_check[0] = time.monotonic()
+
+def test_wrapped_network_error_rebuilds_the_pooled_client(no_health_probe):
+    first = js._get_pooled_client(js.api_key, js.PROJECT_ID)
+    seen = []
+
+    def action(client):
+        seen.append(client)
+        if len(seen) == 1:
+            raise _wrapped_network_error()
+        return "ok"
+
+    assert js._with_client(action) == "ok"
+    assert seen[0] is first
+    assert seen[1] is not first
+
+def test_wrapped_network_error_rebuilds_the_pooled_client_async(no_health_probe):
+    first = js._get_pooled_client(js.api_key, js.PROJECT_ID)
+    seen = []
+
+    async def action(client):
+        seen.append(client)
+        if len(seen) == 1:
+            raise _wrapped_network_error()
+        return "ok"
+
+    assert asyncio.run(js._with_client_async(action)) == "ok"
+    assert seen[0] is first
+    assert seen[1] is not first
+
+def test_other_errors_keep_the_pooled_client(no_health_probe):
+    first = js._get_pooled_client(js.api_key, js.PROJECT_ID)
+
+    def action(client):
+        raise BadInputError("bad row")
+
+    with pytest.raises(BadInputError):
+        js._with_client(action)
+    assert js._get_pooled_client(js.api_key, js.PROJECT_ID) is first
+
+def test_failed_health_probe_drops_the_client(unreachable_client):
+    js._last_health_check[0] = 0.0  # Due for a probe
+    assert js._client_is_healthy(unreachable_client) is False
+
+# ==========================================
+# 🔮 ASK AI PREFETCH
+# ==========================================
+@pytest.fixture
+def sent_prompts(monkeypatch, session, no_health_probe):
+    """Prompts of the prefetch calls actually sent (the answer is the prompt itself)."""
+    sent = []
+
+    async def fake_add_rows(table_type, request):
+        sent.append(request.data[0][js.CHAT_COLS["input"]])
+        raise ValueError("not answering in tests")
+
+    monkeypatch.setattr(js, "PREFETCH_SETTLE", 0.2)
+    monkeypatch.setattr(js, "add_rows_async", fake_add_rows)
+    js._prefetched.clear()
+    yield sent
+    for prefetch in js._prefetched.values():
+        prefetch.cancel()
+    js._prefetched.clear()
+
+def test_prompts_replaced_before_they_settle_cost_nothing(sent_prompts):
+    for sweetness in (100, 75, 50):
+        js.prefetch_chat_answers(f"teh tarik at {sweetness}%", "Malay", result_id="scan-1")
+    time.sleep(0.5)
+
+    assert sorted(sent_prompts) == ["teh tarik at 50%"] * 2  # One call per persona
+
+def test_a_result_is_prefetched_once(sent_prompts):
+    js.prefetch_chat_answers("teh tarik at 100%", "Malay", result_id="scan-1")
+    time.sleep(0.5)
+    js.prefetch_chat_answers("teh tarik at 50%", "Malay", result_id="scan-1")
+    time.sleep(0.5)
+
+    assert sorted(sent_prompts) == ["teh tarik at 100%"] * 2
+
+def test_prefetched_answers_are_not_shared_between_sessions(sent_prompts, session):
+    js.prefetch_chat_answers("teh tarik at 100%", "Malay", result_id="scan-1")
+    time.sleep(0.5)
+
+    session()  # Another user asking the same thing
+    assert js.take_prefetched_chat("teh tarik at 100%", js.CHAT_TABLE_ID, "Malay") is None
+
+# ==========================================
+# 🅰️ NUTRI-GRADE
+# ==========================================
+def _row(col_map, **outputs):
+    """One table row as JamAI returns it (column -> cell), from col_map keys."""
+    return {col_map[key]: {"value": value} for key, value in outputs.items()}
+
+def test_label_results_ignore_the_llm_grade():
+    row = _row(
+        js.IMAGE_COLS, output_name="Teh Botol", output_sugar="30 g", output_fat="0 g",
+        output_sugar_100="12 g", output_fat_100="0 g", output_grade="A",
+        output_comment="", output_alternative="", output_isBeverage="true",
+    )
+    assert js._parse_image_row(row)["grade"] == "D"
+
+def test_label_with_only_per_serving_values_is_graded_per_serving():
+    row = _row(
+        js.IMAGE_COLS, output_name="Kopi", output_sugar="5 g", output_fat="0 g",
+        output_sugar_100="0", output_fat_100="0", output_grade="D",
+        output_comment="", output_alternative="", output_isBeverage="true",
+    )
+    assert js._parse_image_row(row)["grade"] == "B"  # 2 g sugar per 100 ml
+
+def test_drink_and_manual_results_ignore_the_llm_grade():
+    drink = _row(
+        js.DRINK_COLS, output_name="Teh Tarik", output_sugar="9", output_fat="1.5",
+        output_grade="A", output_comment="", output_alternative="", output_isBeverage="true",
+    )
+    manual = _row(
+        js.MANUAL_COLS, output_sugar_100="0.5", output_sugar_serving="1.25",
+        output_fat_100="0", output_fat_serving="0", output_grade="D",
+        output_comment="", output_alternative="",
+    )
+    assert js._parse_drink_row(drink)["grade"] == "C"
+    assert js._parse_manual_row(manual, "teh o kosong")["grade"] == "A"
+
+def test_cached_results_are_regraded():
+    cached = {"sugar_g": 30.0, "fat_g": 0.0, "sugar_100g": 12.0, "fat_100g": 0.0, "grade": "A"}
+    assert js._grade_result(cached)["grade"] == "D"
+
+# ==========================================
+# 🧹 MANUAL LOOKUP PURGE
+# ==========================================
+@pytest.fixture
+def manual_cache(monkeypatch):
+    cache = js.PersistentCache(f"test_manual_lookups_{time.time_ns()}")
+    monkeypatch.setattr(js, "_manual_cache", cache)
+    return cache
+
+def test_purge_drink_removes_only_that_drink(manual_cache):
+    for text, multiplier, language in [
+        ("Teh", 1.0, "English"), ("teh", 0.5, "Malay"),  # The drink being purged
+        ("Teh Tarik", 1.0, "English"), ("1", 1.0, "English"),
+    ]:
+        manual_cache.set(js._manual_key(text, multiplier, language), {"name": text})
+    manual_cache.set(f"other_project:{js.MANUAL_TABLE_ID}:teh:1:English", {"name": "teh"})
+
+    assert js.purge_manual_cache("TEH") == 2
+    assert manual_cache.get(js._manual_key("Teh Tarik", 1.0, "English")) is not None
+    assert manual_cache.get(f"other_project:{js.MANUAL_TABLE_ID}:teh:1:English") is not None
+
+    # A name that matches the multiplier part of every key
+    assert js.purge_manual_cache("1") == 1
+    assert manual_cache.get(js._manual_key("Teh Tarik", 1.0, "English")) is not None
+
+# ==========================================
+# 📦 BATCH ANALYZERS
+# ==========================================
+class _FakeTable:
+    """add_table_rows that answers each row from its input; a request with a "bad" row is rejected whole."""
+
+    def __init__(self):
+        self.request_sizes = []
+
+    def add_table_rows(self, table_type, request, timeout=None):
+        self.request_sizes.append(len(request.data))
+        if any("bad" in str(row.values()) for row in request.data):
+            raise BadInputError("row rejected")
+        return SimpleNamespace(rows=[SimpleNamespace(columns=self._answer(request.table_id, row)) for row in request.data])
+
+    def _answer(self, table_id, row):
+        if table_id == js.MANUAL_TABLE_ID:
+            sugar = float(row[js.MANUAL_COLS["text_input"]].split()[-1])
+            return _row(js.MANUAL_COLS, output_sugar_100=sugar, output_sugar_serving=sugar * 2.5,
+                        output_fat_100=0, output_fat_serving=0, output_comment="", output_alternative="")
+        name = row[js.IMAGE_COLS["image_input"]].rsplit("/", 1)[-1]
+        return _row(js.IMAGE_COLS, output_name=name, output_sugar=1, output_fat=0, output_sugar_100=1,
+                    output_fat_100=0, output_comment="", output_alternative="", output_isBeverage="true")
+
+@pytest.fixture
+def fake_table(monkeypatch, manual_cache):
+    table = _FakeTable()
+    monkeypatch.setattr(js, "_get_pooled_client", lambda token, project_id: SimpleNamespace(table=table))
+    monkeypatch.setattr(js, "_result_cache", js.PersistentCache(f"test_results_{time.time_ns()}"))
+    return table
+
+def test_batch_results_keep_input_order_across_requests(fake_table, manual_cache):
+    texts = [f"zz test drink {i}" for i in range(250)]
+    manual_cache.set(js._manual_key(texts[120], 1.0, "English"), {"name": texts[120], "sugar_100g": 120.0, "sugar_g": 300.0})
+
+    results = js.analyze_manual_inputs_with_jamai(texts)
+
+    assert fake_table.request_sizes == [100, 100, 49]  # MAX_BATCH_ROWS per request, cached one not sent
+    assert [r["name"] for r in results] == texts
+    assert [r["sugar_100g"] for r in results] == [float(i) for i in range(250)]
+
+def test_bad_row_is_retried_alone_without_failing_its_neighbours(fake_table):
+    texts = ["zz drink 1", "zz drink 2", "zz bad drink 3", "zz drink 4"]
+
+    results = js.analyze_manual_inputs_with_jamai(texts)
+
+    assert fake_table.request_sizes == [4, 1, 1, 1, 1]
+    assert [r and r["sugar_100g"] for r in results] == [1.0, 2.0, None, 4.0]
+
+def test_image_batch_keeps_input_order(fake_table, monkeypatch):
+    uploads = [PreparedImage(f"not an image {i}".encode(), f"photo{i}.jpg", 20) for i in range(3)]
+    monkeypatch.setattr(js, "_upload_images_concurrently", lambda files, digests: [f"s3://bucket/{f.name}" for f in files])
+
+    results = js.analyze_images_with_jamai(uploads)
+
+    assert fake_table.request_sizes == [3]
+    assert [r["name"] for r in results] == ["photo0.jpg", "photo1.jpg", "photo2.jpg"]
+
+# ==========================================
+# 📷 SINGLE SCANS
+# ==========================================
+@pytest.fixture
+def scan_calls(fake_table, monkeypatch):
+    """Rows sent by the background scan path (answered by the fake table)."""
+    sent = []
+
+    async def fake_upload(uploaded_file, digest=None):
+        return f"s3://bucket/{uploaded_file.name}"
+
+    async def fake_add_rows(table_type, request):
+        sent.append(request)
+        return fake_table.add_table_rows(table_type, request)
+
+    monkeypatch.setattr(js, "upload_image_async", fake_upload)
+    monkeypatch.setattr(js, "add_rows_async", fake_add_rows)
+    return sent
+
+def test_blocking_scan_runs_the_background_job_and_reuses_its_cache(scan_calls):
+    upload = PreparedImage(b"not an image", "label.jpg", 12)
+
+    result = js.analyze_image_with_jamai(upload)
+    again = js.analyze_image_with_jamai(upload)
+
+    assert len(scan_calls) == 1  # Second scan answered from the cache start_image_scan filled
+    assert result["name"] == again["name"] == "label.jpg"
+
+def test_failed_blocking_scan_returns_none(scan_calls, monkeypatch):
+    reported = []
+    monkeypatch.setattr(js, "_report_error", lambda label, error: reported.append(label))
+
+    assert js.analyze_image_with_jamai(PreparedImage(b"bad image", "bad.jpg", 9)) is None
+    assert reported == ["Image Analysis"]
@@ -0,0 +1,66 @@
+import json
+import pytest
+from services.menu_parser import MenuStreamParser, parse_menu_output
+
+def _stream(text, size=7):
+    """Feeds text in small chunks, like the streaming 'menu' table output."""
+    parser = MenuStreamParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+    return parser
+
+# ==========================================
+# 🧩 ITEM SHAPES
+# ==========================================
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_nested_nutrition_is_merged_into_its_item(size):
+    text = json.dumps({"menu": [
+        {"name": "Teh C", "nutrition": {"sugar_per_100ml": 8, "saturated_fat_per_100ml": 1.2}},
+        {"name": "Kopi O", "nutrition": {"per_serving": {"sugar": 15}}},
+    ]})
+    parser = _stream(text, size)
+
+    assert [item["name"] for item in parser.items] == ["Teh C", "Kopi O"]
+    assert parser.items[0]["sugar_100g"] == 8
+    assert parser.items[0]["fat_100g"] == 1.2
+    assert parser.items[1]["sugar_g"] == 15
+    assert parser.complete
+
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_braces_and_quotes_inside_strings_are_text(size):
+    text = json.dumps([
+        {"name": "Teh {Special} }", "sugar_per_serving": 20},
+        {"name": 'The "Boss" Kopi {', "sugar_per_serving": 18},
+    ])
+    parser = _stream(text, size)
+
+    assert [item["name"] for item in parser.items] == ["Teh {Special} }", 'The "Boss" Kopi {']
+    assert parser.complete
+
+def test_named_drinks_keyed_by_name_are_separate_items():
+    items, complete = parse_menu_output(json.dumps({"drinks": {
+        "a": {"name": "Milo Ais", "sugar_per_serving": 25},
+        "b": {"name": "Teh O", "sugar_per_serving": 12},
+    }}))
+    assert [item["name"] for item in items] == ["Milo Ais", "Teh O"]
+    assert complete
+
+# ==========================================
+# 🩹 DAMAGE CONTROL
+# ==========================================
+def test_fences_and_prose_around_the_json_are_ignored():
+    text = 'Here is the "menu":\n```json\n[{"name": "Teh Tarik", "sugar": 20}]\n```\nEnjoy!'
+    items, complete = parse_menu_output(text)
+    assert [item["name"] for item in items] == ["Teh Tarik"]
+    assert complete
+
+def test_a_broken_item_only_loses_itself():
+    text = '{"menu": [{"name": "Teh", "sugar": 20}, {"name": "Kopi", "sugar": }, {"name": "Milo", "sugar": 25,}]}'
+    items, complete = parse_menu_output(text)
+    assert [item["name"] for item in items] == ["Teh", "Milo"]
+    assert not complete
+
+def test_a_cut_off_tail_is_not_complete():
+    items, complete = parse_menu_output('[{"name": "Teh", "sugar": 20}, {"name": "Ko')
+    assert [item["name"] for item in items] == ["Teh"]
+    assert not complete
@@ -0,0 +1,82 @@
+import asyncio
+import httpx
+import pytest
+from jamaibase import types as p
+from jamaibase.utils.exceptions import BadInputError, JamaiException
+from services.resilience import (
+    BudgetExceededError, CircuitBreaker, CircuitOpenError,
+    call_with_retry, call_with_retry_async, is_outage, transport_error,
+)
+
+def _add_row(client, timeout=2):
+    request = p.MultiRowAddRequest(table_id="scanner", data=[{"image": "x"}], stream=False)
+    return client.table.add_table_rows("action", request, timeout=timeout)
+
+def _wrapped(cause):
+    """What jamaibase raises for a non-Jamai error: a JamaiException chained to it."""
+    try:
+        raise JamaiException(str(cause)) from cause
+    except JamaiException as e:
+        return e
+
+# ==========================================
+# 🚦 ERROR CLASSIFICATION
+# ==========================================
+def test_unreachable_api_is_an_outage(unreachable_client):
+    with pytest.raises(Exception) as info:
+        _add_row(unreachable_client)
+
+    # jamaibase hides the network error behind a plain JamaiException
+    assert not isinstance(info.value, httpx.TransportError)
+    assert isinstance(transport_error(info.value), httpx.ConnectError)
+    assert is_outage(info.value)
+
+def test_bad_request_is_not_an_outage():
+    assert not is_outage(BadInputError("bad row"))
+    assert not is_outage(_wrapped(ValueError("not a network error")))
+
+# ==========================================
+# 🔁 RETRY + CIRCUIT BREAKER
+# ==========================================
+def test_network_failures_are_retried_and_trip_the_breaker(unreachable_client):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    attempts = []
+
+    def action(timeout):
+        attempts.append(timeout)
+        return _add_row(unreachable_client, timeout)
+
+    with pytest.raises(JamaiException):
+        call_with_retry(action, budget=30, breaker=breaker, attempts=3, base_delay=0, max_delay=0)
+
+    assert len(attempts) == 3
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_wrapped_timeout_becomes_budget_exceeded():
+    def action(timeout):
+        raise _wrapped(httpx.ReadTimeout("read timed out"))
+
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    with pytest.raises(BudgetExceededError):
+        call_with_retry(action, budget=30, breaker=breaker, attempts=1)
+
+def test_cancelled_trial_call_frees_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure(_wrapped(httpx.ConnectError("refused")))
+
+    async def hang(timeout):
+        await asyncio.sleep(60)
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(call_with_retry_async(hang, budget=30, breaker=breaker))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+
+    # The next call is allowed through as a new half-open trial
+    assert breaker.before_call() is True
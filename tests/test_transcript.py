@@ -0,0 +1,40 @@
+import gc
+import os
+import stat
+import time
+import uuid
+import pytest
+from services.transcript import TranscriptStore, clear_on_session_end
+
+@pytest.fixture
+def store():
+    return TranscriptStore(name=f"test_transcripts_{uuid.uuid4().hex}")
+
+# ==========================================
+# 🗑️ RETENTION
+# ==========================================
+def test_conversation_is_deleted_when_the_session_ends(store, session):
+    clear_on_session_end(store, "s1")
+    store.append("s1", "user", "boleh minum teh?")
+    store.append("s2", "user", "someone else's question")
+
+    session()  # Streamlit drops the old session state
+    gc.collect()
+
+    assert store.count("s1") == 0
+    assert store.count("s2") == 1
+
+def test_untouched_conversations_expire(store):
+    store.append("s1", "user", "boleh minum teh?")
+    store.ttl = 0.01
+    time.sleep(0.05)
+    store.append("s2", "user", "a newer question")
+
+    assert store.purge_expired() == 1
+    assert store.count("s1") == 0
+    assert store.count("s2") == 1
+
+def test_transcript_file_is_private(store):
+    store.append("s1", "user", "boleh minum teh?")
+    for suffix in ("", "-wal"):
+        assert stat.S_IMODE(os.stat(store.path + suffix).st_mode) == 0o600
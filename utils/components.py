@@ -1,11 +1,29 @@
+import os
+import math
+from functools import lru_cache
 import streamlit as st
-import plotly.graph_objects as go
+from streamlit.errors import StreamlitAPIException
+
+# Donut renderer for the dashboard: "svg" (cached inline SVG, no Plotly needed) or "plotly"
+DONUT_RENDERER = os.environ.get("CEKMANIS_DONUT_RENDERER", "svg").strip().lower()
 
 # --- Load CSS ---
 def load_css():
    
     pass
 
+# --- Fragment Rerun ---
+def rerun_fragment():
+    """
+    Reruns only the @st.fragment this is called from. If the current run is
+    a full app run anyway (e.g. a widget outside the fragment changed too),
+    falls back to st.rerun().
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
 # --- Diabetes Risk Algorithm  ---
 def calculate_diabetes_risk(bmi, daily_sugar_grams):
     """
@@ -62,6 +80,8 @@ def get_status_color(value, limit):
     else: return '#ef4444'
 
 def donut_chart(value, limit, label):
+    import plotly.graph_objects as go  # Only needed with the "plotly" renderer
+
     color = get_status_color(value, limit)
     remaining = max(0, limit - value)
     
@@ -74,6 +94,46 @@ def donut_chart(value, limit, label):
     
     return fig
 
+# Same ring as donut_chart: 140px, hole 0.75, consumed clockwise from 12 o'clock
+DONUT_SVG = """<div style="display: flex; justify-content: center;">
+<svg viewBox="0 0 140 140" width="140" height="140" role="img" xmlns="http://www.w3.org/2000/svg">
+<title>{label}: {text} consumed, {remaining:g}g remaining</title>
+<circle cx="70" cy="70" r="{radius}" fill="none" stroke="#f1f5f9" stroke-width="{width}"/>
+<circle cx="70" cy="70" r="{radius}" fill="none" stroke="{color}" stroke-width="{width}" stroke-dasharray="{arc:.2f} {circumference:.2f}" transform="rotate(-90 70 70)"/>
+<text x="70" y="70" text-anchor="middle" dominant-baseline="central" font-size="26" font-weight="bold" fill="{color}">{text}</text>
+</svg>
+</div>"""
+
+@lru_cache(maxsize=1024)
+def donut_svg(value, limit, color, label):
+    """
+    The donut as inline SVG. Cached by (rounded value, limit, colour, label);
+    plain lru_cache, since hashing arguments for st.cache_data costs more than
+    the formatting it would save.
+    """
+    radius = 70 * (1 + 0.75) / 2   # Middle of the ring
+    width = 70 * (1 - 0.75)
+    circumference = 2 * math.pi * radius
+    share = min(1.0, value / limit) if limit > 0 else 1.0
+    return DONUT_SVG.format(
+        label=label,
+        text=f"{int(value)}g",
+        remaining=max(0, limit - value),
+        radius=radius,
+        width=width,
+        color=color,
+        arc=share * circumference,
+        circumference=circumference,
+    )
+
+def show_donut(value, limit, label):
+    """Draws the consumed / remaining donut with the renderer chosen by CEKMANIS_DONUT_RENDERER."""
+    if DONUT_RENDERER == "plotly":
+        st.plotly_chart(donut_chart(value, limit, label), width='stretch', config={'displayModeBar':False})
+        return
+    value = round(float(value), 1)  # Finer than the ring or label can show
+    st.markdown(donut_svg(value, limit, get_status_color(value, limit), label), unsafe_allow_html=True)
+
 def stat_card(label, value, sublabel=""):
     return f"""
     <div class='stat-box'>
@@ -0,0 +1,44 @@
+import numpy as np
+
+# ==========================================
+# 🔧 NUTRI-GRADE THRESHOLDS (single source of truth)
+# ==========================================
+# Per 100 ml, from the Nutri-Grade table in JamAI/Grading_System.parquet:
+# a drink gets the worst grade of its sugar and saturated-fat grades.
+#
+#   Grade | Sugar (g/100ml) | Saturated fat (g/100ml)
+#   A     | <= 1            | <= 0.7
+#   B     | <= 5            | <= 1.2
+#   C     | <= 10           | <= 2.8
+#   D     | > 10            | > 2.8
+GRADES = np.array(["A", "B", "C", "D"])
+SUGAR_LIMITS = np.array([1.0, 5.0, 10.0])
+FAT_LIMITS = np.array([0.7, 1.2, 2.8])
+
+# Serving size used when only per-serving values are known (e.g. old history entries)
+SERVING_ML = 250
+
+# ==========================================
+# 🅰️ GRADING API
+# ==========================================
+def nutrigrades(sugar_100ml, fat_100ml):
+    """
+    Vectorized Nutri-Grade for whole menus / histories.
+    Takes array-likes of sugar and saturated fat per 100 ml; returns an array of "A".."D".
+    """
+    sugar = np.nan_to_num(np.asarray(sugar_100ml, dtype=float))
+    fat = np.nan_to_num(np.asarray(fat_100ml, dtype=float))
+
+    # Number of limits strictly exceeded = grade index (0 = A ... 3 = D)
+    sugar_level = np.searchsorted(SUGAR_LIMITS, sugar, side="left")
+    fat_level = np.searchsorted(FAT_LIMITS, fat, side="left")
+    return GRADES[np.maximum(sugar_level, fat_level)]
+
+def nutrigrade(sugar_100ml, fat_100ml=0.0):
+    """Nutri-Grade of a single drink from sugar and saturated fat per 100 ml."""
+    return str(nutrigrades([sugar_100ml], [fat_100ml])[0])
+
+def nutrigrades_per_serving(sugar_g, fat_g, serving_ml=SERVING_ML):
+    """Vectorized Nutri-Grade from per-serving grams (assumes one serving = serving_ml)."""
+    scale = 100.0 / serving_ml
+    return nutrigrades(np.asarray(sugar_g, dtype=float) * scale, np.asarray(fat_g, dtype=float) * scale)
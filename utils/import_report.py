@@ -0,0 +1,156 @@
+import os
+import re
+import ast
+import sys
+import json
+import subprocess
+
+# ==========================================
+# 🔧 CONFIGURATION
+# ==========================================
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 1. Import-Time Budget per Page (milliseconds on top of `import streamlit`)
+# Roughly 2x what a cold start measures on a laptop, so only real regressions trip it.
+PAGE_BUDGETS_MS = {
+    "Home.py": 250,
+    "pages/1_📷_Scanner.py": 500,
+    "pages/2_💬_Chat.py": 500,
+}
+
+# 2. Heavy Dependencies that must stay deferred (loaded on first real use, not on page load)
+DEFERRED_MODULES = ("jamaibase", "plotly", "pandas", "pyarrow")
+
+# 3. Measurement
+RUNS = 3         # Fresh interpreter per run; the fastest run is reported (least noise)
+TOP_MODULES = 5  # Slowest modules listed per page
+
+# ==========================================
+# ⏱️ IMPORT-TIME REPORT
+# ==========================================
+def page_imports(page):
+    """The import statements a page runs at load (top level, including try blocks)."""
+    with open(os.path.join(ROOT, page), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=page)
+
+    statements = []
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append(ast.unparse(node))
+        elif isinstance(node, ast.Try):
+            nodes[:0] = node.body
+    return statements
+
+# Runs in a fresh interpreter: times the page's imports after streamlit itself,
+# with secrets already parsed as the server does at startup (web/bootstrap.py).
+# A deferred module counts as loaded if the page's imports loaded it, or if app
+# code imported it at all (streamlit may have loaded it already, e.g. plotly).
+_PROBE = """
+import sys, json, time, builtins
+import streamlit
+from streamlit.runtime.secrets import secrets_singleton
+secrets_singleton.load_if_toml_exists()
+
+deferred = {deferred!r}
+before = {{m for m in deferred if m in sys.modules}}
+requested = set()
+real_import = builtins.__import__
+
+def watch(name, globals=None, locals=None, fromlist=(), level=0):
+    caller = (globals or {{}}).get("__file__") or ""
+    from_app = (globals or {{}}).get("__name__") == "__main__" or (
+        caller.startswith({root!r}) and "site-packages" not in caller
+    )
+    if level == 0 and from_app and name.split(".")[0] in deferred:
+        requested.add(name.split(".")[0])
+    return real_import(name, globals, locals, fromlist, level)
+
+builtins.__import__ = watch
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+builtins.__import__ = real_import
+
+loaded = {{m for m in deferred if m in sys.modules}} - before
+print(json.dumps({{"ms": elapsed * 1000, "loaded": sorted(loaded | requested)}}))
+"""
+
+def _run_probe(statements):
+    code = _PROBE.format(imports="\n".join(statements), deferred=DEFERRED_MODULES, root=ROOT + os.sep)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "probe failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # "import time: self [us] | cumulative | name" lines, minus what streamlit itself loads
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            modules.append((int(match.group(1)) / 1000, match.group(4)))
+    result["modules"] = modules
+    return result
+
+def measure_page(page):
+    """
+    Cold import cost of one page: {"ms", "loaded" (deferred modules that got
+    imported anyway), "slowest" [(ms, module)]}. Fastest of RUNS fresh runs.
+    """
+    statements = page_imports(page)
+    baseline_run = _run_probe([])
+    baseline = {name for _, name in baseline_run["modules"]}
+
+    best = None
+    for _ in range(RUNS):
+        result = _run_probe(statements)
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+
+    own = [(ms, name) for ms, name in best["modules"] if name not in baseline]
+    best["slowest"] = sorted(own, reverse=True)[:TOP_MODULES]
+    return best
+
+def report(pages=None):
+    """Prints the report; returns the pages over budget or loading a deferred module."""
+    failures = []
+    for page in pages or PAGE_BUDGETS_MS:
+        budget = PAGE_BUDGETS_MS.get(page)
+        try:
+            result = measure_page(page)
+        except RuntimeError as e:
+            print(f"{page}: could not import ({e})")
+            failures.append(page)
+            continue
+
+        over = budget is not None and result["ms"] > budget
+        status = "OVER BUDGET" if over else "ok"
+        print(f"{page}: {result['ms']:.0f} ms (budget {budget} ms) {status}")
+        for ms, name in result["slowest"]:
+            print(f"    {ms:7.1f} ms  {name}")
+        if result["loaded"]:
+            print(f"    should be deferred: {', '.join(result['loaded'])}")
+        if over or result["loaded"]:
+            failures.append(page)
+    return failures
+
+# ==========================================
+# 🛠️ CLI
+# ==========================================
+# python -m utils.import_report           (report only)
+# python -m utils.import_report --check   (exit 1 on a regression, for CI after a deploy)
+# Needs .streamlit/secrets.toml like the app itself (any values will do).
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args not in ([], ["--check"]):
+        print("usage: python -m utils.import_report [--check]")
+        sys.exit(2)
+
+    failures = report()
+    if args == ["--check"] and failures:
+        print(f"import-time check failed: {', '.join(failures)}")
+        sys.exit(1)
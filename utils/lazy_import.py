@@ -0,0 +1,40 @@
+import importlib
+import threading
+
+# ==========================================
+# 💤 DEFERRED IMPORTS
+# ==========================================
+class LazyModule:
+    """
+    Stand-in for a heavy module (e.g. jamaibase, ~1.5 s to import) that is
+    only imported on first attribute access, so pages that never call it
+    (or have not called it yet) render without paying for it.
+
+        p = LazyModule("jamaibase.types")
+        p.MultiRowAddRequest(...)  # jamaibase is imported here
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Imports the module now (no-op once loaded) and returns it."""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        # Only called for names not set in __init__, i.e. the module's own
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
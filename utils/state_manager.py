@@ -1,5 +1,6 @@
 import streamlit as st
 import time
+from utils.grading import nutrigrades_per_serving
 
 def init_session_state():
     """initialize Session State variable"""
@@ -28,8 +29,20 @@ def init_session_state():
     if 'analyzed_data' not in st.session_state:
         st.session_state.analyzed_data = None
 
-def add_intake(sugar, fat, name):
-    """add intake"""
+    # --- grade older history entries once (not on every rerun) ---
+    backfill_grades(st.session_state.history)
+
+def backfill_grades(history):
+    """Stores a Nutri-Grade on history entries saved before grades were kept."""
+    missing = [item for item in history if not item.get('grade')]
+    if not missing:
+        return
+    grades = nutrigrades_per_serving([item['sugar'] for item in missing], [item.get('fat', 0) for item in missing])
+    for item, grade in zip(missing, grades):
+        item['grade'] = str(grade)
+
+def add_intake(sugar, fat, name, grade=None):
+    """add intake (grade: Nutri-Grade of the drink, computed from the serving if not given)"""
     # Ensure state is initialized
     init_session_state()
     
@@ -43,7 +56,8 @@ def add_intake(sugar, fat, name):
         'id': item_id,
         'name': name,
         'sugar': sugar,
-        'fat': fat
+        'fat': fat,
+        'grade': grade or str(nutrigrades_per_serving([sugar], [fat])[0])
     })
 
 def delete_intake(item_id):